@@ -8,13 +8,16 @@ Created on Wed Dec 23 13:26:41 2020
 
 from flask_table import Table, Col, LinkCol
 from flask import Flask, Markup, request, url_for, render_template
+from flask import jsonify, make_response
 from flask_dropzone import Dropzone
+from functools import wraps
+import datetime as dt
 import json
 
 
-import wimm.utils as utils
-import wimm.core as core
-import wimm.structure
+import wimm
+from wimm.storage import get_storage
+from wimm.views import InvoiceViews, TransactionViews, SORTABLE, data_version
 
 """
 A example for creating a Table that is sortable by its header
@@ -23,9 +26,91 @@ A example for creating a Table that is sortable by its header
 app = Flask(__name__)
 dropzone = Dropzone(app)
 
+PER_PAGE = 50
+
+wimm.settings = wimm.get_settings()
+storage = get_storage(wimm.settings['path'], wimm.settings)
+_views = None
+_transaction_views = None
+
+
+def invoices():
+    """ invoices, loaded again when `invoices.yaml` changes """
+    return storage.load('invoices')
+
+
+def invoice_views():
+    """ views of the current invoices, sort orders are kept between
+    requests until the data changes """
+    global _views
+    invs = invoices()
+    if _views is None or _views.invoices is not invs:
+        _views = InvoiceViews(invs)
+    return _views
+
+
+def transaction_views():
+    """ views of the current transactions """
+    global _transaction_views
+    trs = storage.load('transactions')
+    if _transaction_views is None or _transaction_views.transactions is not trs:
+        _transaction_views = TransactionViews(trs)
+    return _transaction_views
+
+
+def conditional(*names):
+    """ answer 304 Not Modified if the data files `names` did not change
+    since the client's ETag or date, without building the response """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, modified = data_version(storage, names)
+            since = request.if_modified_since
+            if request.if_none_match.contains(etag) or (
+                    not request.if_none_match and since is not None
+                    and modified.replace(microsecond=0) <= since):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+            response.set_etag(etag)
+            response.last_modified = modified
+            return response
+        return wrapper
+    return decorator
+
+
+class ApiError(Exception):
+    """ invalid request parameter, answered with 400 Bad Request """
+
+
+@app.errorhandler(ApiError)
+def api_error(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def date_arg(name):
+    """ ISO date parameter `name`, None if not given """
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return dt.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ApiError(f'invalid date {name}={value}')
+
+
+def plain(record):
+    """ record as dict with iso dates """
+    return {k: v.isoformat() if isinstance(v, dt.date) else v
+            for k, v in record.items()}
+
+
+def to_json(page):
+    return jsonify({'page': page.page, 'pages': page.pages,
+                    'total': page.total,
+                    'items': [plain(item) for item in page.items]})
 
-invoices = wimm.structure.invoices
-#invoices = wimm.core.Invoices.from_yaml('invoices.yaml')
 
 class SortableTable(Table):
     #classes = ['striped']
@@ -41,7 +126,9 @@ class SortableTable(Table):
             direction = 'desc'
         else:
             direction = 'asc'
-        return url_for('index', sort=col_key, direction=direction)
+        return url_for('index', sort=col_key, direction=direction,
+                       q=request.args.get('q', ''),
+                       prefix=request.args.get('prefix', ''))
 
 
 @app.route('/test')
@@ -52,21 +139,82 @@ def test():
 @app.route('/')
 def index():
     sort = request.args.get('sort', 'id')
+    if sort not in SORTABLE:
+        sort = 'id'
     reverse = (request.args.get('direction', 'asc') == 'desc')
-    table = SortableTable(invoices.get_sorted_by(sort, reverse),
+    search = request.args.get('q', '')
+    prefix = request.args.get('prefix', '')
+    page = invoice_views().query(sort, reverse, search, prefix,
+                                 page=request.args.get('page', 1, type=int),
+                                 per_page=PER_PAGE)
+    table = SortableTable(page.items,
                           sort_by=sort,
                           sort_reverse=reverse)
-    
-    
-    return render_template('invoices_received.html', title="WIMM", table = table)
+
+    def page_url(number):
+        return url_for('index', sort=sort, direction=request.args.get('direction', 'asc'),
+                       q=search, prefix=prefix, page=number)
+
+    return render_template('invoices_received.html', title="WIMM", table=table,
+                           page=page, page_url=page_url, search=search, prefix=prefix)
 
 
 @app.route('/item/<id>')
 def show_item(id):
-    inv = invoices.get_by_id(id)
+    inv = invoices().get_by_id(id)
     return json.dumps(inv.to_dict(),indent=4)
 
 
 
+@app.route('/api/balance')
+@conditional('balance', 'transactions', 'invoices')
+def api_balance():
+    """ account balances, options as `wimm show balance` """
+    import wimm.core as core
+    import wimm.utils as utils
+
+    args = request.args
+    accounts = storage.balance(date_arg('date'),
+                               args.get('invoices', type=int, default=0) == 1)
+    try:
+        balance = core.account_tree(accounts).balance(
+            args.get('depth', type=int), args.get('account'),
+            args.get('nozeros', type=int, default=0) == 1)
+    except KeyError as e:  # unknown account
+        raise ApiError(e.args[0])
+    total = utils.from_cents(int(utils.to_cents(balance.values).sum()))
+    return jsonify({'accounts': balance.to_dict(), 'sum': total})
+
+
+@app.route('/api/transactions')
+@conditional('transactions')
+def api_transactions():
+    """ transactions with `from <= date < to`, for `account` and its
+    subaccounts """
+
+    args = request.args
+    page = transaction_views().query(date_arg('from'), date_arg('to'),
+                                     args.get('account'),
+                                     page=args.get('page', 1, type=int),
+                                     per_page=args.get('per_page', 100, type=int))
+    return to_json(page)
+
+
+@app.route('/api/invoices')
+@conditional('invoices')
+def api_invoices():
+    """ invoices sorted on `sort`, selected on `q` and `prefix` """
+
+    args = request.args
+    sort = args.get('sort', 'id')
+    if sort not in SORTABLE:
+        return jsonify({'error': f'can not sort on {sort}'}), 400
+    page = invoice_views().query(sort, args.get('direction') == 'desc',
+                                 args.get('q'), args.get('prefix'),
+                                 page=args.get('page', 1, type=int),
+                                 per_page=args.get('per_page', PER_PAGE, type=int))
+    return to_json(page)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
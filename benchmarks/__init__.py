@@ -0,0 +1,3 @@
+"""
+benchmarks, run from the repository root as `python -m benchmarks.<name>`
+"""
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reproducible synthetic databases for benchmarks.
+
+The account tree, transactions and invoices only depend on the parameters
+and the seed, so timings of different versions can be compared.
+
+usage: python -m benchmarks.generator path [nr_transfers]
+"""
+import random
+import sys
+from pathlib import Path
+
+import wimm.structure as structure
+import wimm.yamlio as yamlio
+
+ROOTS = ['Assets', 'Liabilities', 'Equity', 'Income', 'Expenses', 'Ext']
+PREFIXES = ['INR', 'INS']
+
+
+def make_accounts(n=50, depth=3, seed=0):
+    """ `n` account names in a tree of `depth` levels below the roots """
+    rnd = random.Random(seed)
+    accounts = set()
+    while len(accounts) < n:
+        parts = [rnd.choice(ROOTS)]
+        for level in range(rnd.randint(1, depth)):
+            parts.append(f'{parts[0][:3].lower()}{level}_{rnd.randint(0, 9)}')
+        accounts.add('.'.join(parts))
+    return sorted(accounts)
+
+
+def make_transactions(n, accounts=None, max_transfers=4, seed=0,
+                      start_year=2015, years=10):
+    """ `n` balanced transactions in the file format, sorted by date """
+
+    rnd = random.Random(seed)
+    accounts = accounts or make_accounts(seed=seed)
+    days = sorted(rnd.randrange(years * 365) for _ in range(n))
+
+    data = []
+    for i, day in enumerate(days):
+        year, rest = divmod(day, 365)
+        month, dom = divmod(rest % 336, 28)
+        *accts, last = rnd.sample(accounts, rnd.randint(2, max_transfers))
+        transfers = {acct: round(rnd.uniform(-5000, 5000), 2)
+                     for acct in accts}
+        transfers[last] = -round(sum(transfers.values()), 2)
+        data.append({'date': '%04d-%02d-%02d' % (start_year + year, month + 1,
+                                                 dom + 1),
+                     'description': f'payment {i} ref {rnd.getrandbits(32):x}',
+                     'transfers': transfers})
+    return data
+
+
+def make_invoices(n, seed=0, start_year=2015, years=10):
+    """ `n` invoices with ids numbered per prefix and year """
+
+    rnd = random.Random(seed)
+    settings = structure.settings
+    counters = {}
+    data = []
+    for _ in range(n):
+        prefix = rnd.choice(PREFIXES)
+        year = start_year + rnd.randrange(years)
+        nr = counters[prefix, year] = counters.get((prefix, year), 0) + 1
+        invoice_id = f'{prefix}{year % 100:02d}_{nr:03d}'
+        ext_name = f'Company_{rnd.randrange(500)}'
+        params = {'company_name': settings['company_name'],
+                  'invoice_id': invoice_id, 'ext_name': ext_name}
+        accounts = {k: v.format(**params) for k, v in
+                    settings['invoice_accounts'][prefix].items()}
+        amount = round(rnd.uniform(10, 10000), 2)
+        date = '%04d-%02d-%02d' % (year, rnd.randint(1, 12), rnd.randint(1, 28))
+        data.append({'id': invoice_id, 'amount': amount,
+                     'tax': round(amount * settings['tax_rate'], 2),
+                     'date': date, 'from': accounts['from'],
+                     'to': accounts['to'], 'description': f'invoice {nr}',
+                     'attachment': None, 'due_date': None,
+                     'ext_name': ext_name})
+    return data
+
+
+def make_documents(folder, n, size=10_000, seed=0):
+    """ write `n` files with random content """
+    rnd = random.Random(seed)
+    folder.mkdir(parents=True, exist_ok=True)
+    for i in range(n):
+        (folder / f'document_{i:06d}.pdf').write_bytes(rnd.randbytes(size))
+
+
+def generate(path, transfers=10_000, accounts=50, depth=3, invoices=1000,
+             documents=0, seed=0):
+    """ write a database folder with about `transfers` transfers """
+
+    path = Path(path)
+    (path / structure.folders['WIMM']).mkdir(parents=True, exist_ok=True)
+
+    names = make_accounts(accounts, depth, seed)
+    # 3 transfers per transaction on average
+    trs = make_transactions(max(1, transfers // 3), names, seed=seed)
+
+    yamlio.dump_file(path / structure.files['settings'], structure.settings)
+    yamlio.dump_file(path / structure.files['balance'],
+                     {name: 0.0 for name in names if name.startswith('Assets')})
+    yamlio.dump_file(path / structure.files['transactions'], trs)
+    yamlio.dump_file(path / structure.files['invoices'],
+                     make_invoices(invoices, seed))
+    if documents:
+        make_documents(path / structure.folders['INR'], documents, seed=seed)
+    return path
+
+
+if __name__ == '__main__':
+    generate(sys.argv[1], *[int(v) for v in sys.argv[2:]])
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark bank statement importers on synthetic statements.
+The previous row-wise conversions are timed for comparison.
+
+usage: python -m benchmarks.importers [nr_rows ...]
+       (default 10000 100000 1000000)
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import wimm
+from wimm.core import Transactions
+from wimm.utils import clean_str
+from wimm.importers import asn_bank, knab_bank
+
+NAMES = np.array(['Albert Heijn', 'N.S. Reizigers', 'Bob de Vries',
+                  'Belastingdienst', 'Shell Station 12'], dtype=object)
+
+
+def make_asn(csv_file, n, seed=0):
+    """ write a synthetic ASN statement """
+    rnd = np.random.default_rng(seed)
+    df = pd.DataFrame('', index=range(n), columns=asn_bank.mapping['header'])
+    df['Boekingsdatum'] = (np.datetime64('2015-01-01') + rnd.integers(
+        0, 3000, n)).astype('datetime64[D]').astype(str)
+    df['Naam tegenrekening'] = NAMES[rnd.integers(0, len(NAMES), n)]
+    df.loc[rnd.random(n) < 0.05, 'Naam tegenrekening'] = np.nan
+    df['Bedrag'] = np.round(rnd.uniform(-1000, 1000, n), 2)
+    df['Omschrijving'] = [f"'payment {i}'" for i in range(n)]
+    df.to_csv(csv_file, header=False, index=False)
+
+
+def make_knab(csv_file, n, seed=0):
+    """ write a synthetic KNAB statement """
+    rnd = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Transactiedatum': (np.datetime64('2015-01-01') + rnd.integers(
+            0, 3000, n)).astype('datetime64[D]').astype(str),
+        'Bedrag': np.round(rnd.uniform(0, 1000, n), 2),
+        'Omschrijving': [f'payment {i}' for i in range(n)],
+        'Tegenrekeninghouder': NAMES[rnd.integers(0, len(NAMES), n)],
+        'CreditDebet': np.where(rnd.random(n) < 0.5, 'C', 'D')})
+    with open(csv_file, 'w') as f:
+        f.write('KNAB export\n')
+        df.to_csv(f, sep=';', decimal=',', index=False)
+
+
+def asn_rowwise(importer, acct_name='Assets.Bank.ASN'):
+    """ previous ASN conversion """
+    data = []
+    for r in importer.df.to_dict(orient='records'):
+        try:
+            ext_name = 'Ext.'+clean_str(r['name'])
+        except AttributeError:
+            ext_name = 'Ext.unknown'
+        data.append({'date': r['date'].strftime(wimm.DATE_FMT),
+                     'description': r['description'].strip("'"),
+                     'transfers': {acct_name: r['amount'],
+                                   ext_name: -r['amount']}})
+    return Transactions(data)
+
+
+def knab_rowwise(csv_file, account='Assets.Bank.KNAB'):
+    """ previous KNAB import """
+
+    def fcn_from(row):
+        return ('Ext.'+clean_str(row['Tegenrekeninghouder'])) if row['CreditDebet'] == 'C' else 'Assets.Bank.KNAB'
+
+    def fcn_to(row):
+        return (account) if row['CreditDebet'] == 'C' else 'Uncategorized'
+
+    df = pd.read_csv(csv_file, sep=';', header=1, parse_dates=[
+                     'Transactiedatum'], decimal=',')
+    src_cols = ['Bedrag', 'Transactiedatum', 'Omschrijving']
+    tr = df[src_cols].rename(
+        dict(zip(src_cols, ['amount', 'date', 'description'])), axis=1)
+    tr['from'] = df.apply(fcn_from, axis=1)
+    tr['to'] = df.apply(fcn_to, axis=1)
+    tr.date = tr.date.apply(lambda x: x.strftime(wimm.DATE_FMT))
+    return Transactions(tr.to_dict(orient='records'))
+
+
+def timeit(fcn):
+    t = time.perf_counter()
+    res = fcn()
+    return time.perf_counter() - t, res
+
+
+def run(n, folder):
+
+    asn_file = Path(folder) / f'asn_{n}.csv'
+    knab_file = Path(folder) / f'knab_{n}.csv'
+    make_asn(asn_file, n)
+    make_knab(knab_file, n)
+
+    importer = asn_bank.Importer(asn_file)
+    t_read, _ = timeit(importer.read)
+    t_new, new = timeit(importer.transactions)
+    t_old, old = timeit(lambda: asn_rowwise(importer))
+    assert new == old, 'ASN results differ'
+    yield 'ASN', n, t_read, t_old, t_new
+
+    t_new, new = timeit(lambda: knab_bank.knab_import(knab_file))
+    t_old, old = timeit(lambda: knab_rowwise(knab_file))
+    assert new == old, 'KNAB results differ'
+    yield 'KNAB', n, 0.0, t_old, t_new
+
+
+def main(*sizes):
+
+    sizes = sizes or (10_000, 100_000, 1_000_000)
+    print(f'{"bank":<6}{"rows":>10}{"read [s]":>10}{"row-wise [s]":>14}'
+          f'{"vectorized [s]":>16}{"speedup":>9}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in sizes:
+            for bank, n, t_read, t_old, t_new in run(n, folder):
+                print(f'{bank:<6}{n:>10}{t_read:>10.2f}{t_old:>14.2f}'
+                      f'{t_new:>16.2f}{t_old/t_new:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(v) for v in sys.argv[1:]])
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark memory and construction time of `Transaction` and `Invoice`
+against the previous `UserDict` based classes.
+
+usage: python -m benchmarks.records [nr_records]
+"""
+import sys
+import time
+import tracemalloc
+from collections import UserDict
+
+from wimm import core
+
+
+class UserDictTransaction(UserDict):
+    """ previous implementation """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for k, v in [('date', None), ('description', ''), ('transfers', {})]:
+            self.setdefault(k, v)
+        self._check_totals()
+
+    def __getattr__(self, name):
+        if name != 'data' and name in self.data:
+            return self.data[name]
+        raise AttributeError(name)
+
+    _check_totals = core.Transaction._check_totals
+
+
+class UserDictInvoice(UserDict):
+    """ previous implementation """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        keys = ['id', 'amount', 'tax', 'date', 'from', 'to',
+                'description', 'attachment', 'due_date', 'ext_name']
+        vals = ['INV00_000', 0.0, None,  None, 'Uncategorized',
+                'Uncategorized', None, None, None, 'ext_company_name']
+        for k, v in zip(keys, vals):
+            self.setdefault(k, v)
+
+
+def transaction_data(n):
+    return [{'date': '2021-03-01', 'description': f'payment {i}',
+             'transfers': {'Assets.Bank': float(i), 'Ext.Bob': -float(i)}}
+            for i in range(n)]
+
+
+def invoice_data(n):
+    return [{'id': 'INR21_%03d' % (i % 1000), 'amount': float(i), 'tax': 1.0,
+             'date': '2021-03-01', 'description': f'invoice {i}'}
+            for i in range(n)]
+
+
+def measure(cls, data):
+    """ return construction time [s] and allocated memory [bytes] """
+
+    tracemalloc.start()
+    objs = [cls(**d) for d in data]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objs
+
+    # timing without tracemalloc overhead
+    t = time.perf_counter()
+    objs = [cls(**d) for d in data]
+    elapsed = time.perf_counter() - t
+    return elapsed, size
+
+
+def main(n=100_000):
+
+    cases = [('Transaction', transaction_data(n),
+              UserDictTransaction, core.Transaction),
+             ('Invoice', invoice_data(n), UserDictInvoice, core.Invoice)]
+
+    print(f'{n} records')
+    print(f'{"class":<12}{"impl":<10}{"time [s]":>10}{"memory [MB]":>14}')
+    for name, data, old, new in cases:
+        for impl, cls in [('UserDict', old), ('Record', new)]:
+            elapsed, size = measure(cls, data)
+            print(f'{name:<12}{impl:<10}{elapsed:>10.3f}{size/1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main(*[int(v) for v in sys.argv[1:]])
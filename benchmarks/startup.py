@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark cli startup time.
+
+Measures the import time of `wimm.cli` with `python -X importtime` and the
+wall time of `wimm --help` and `wimm info`. Fails (exit code 1) when one of
+the commands imports a heavy module or is slower than `LIMITS`.
+
+usage: python -m benchmarks.startup [repeat]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import wimm.structure as structure
+import wimm.yamlio as yamlio
+
+HEAVY = ['pandas', 'numpy']
+LIMITS = {'--help': 0.5, 'info': 0.5}  # seconds, generous for slow machines
+
+RUN_CLI = ('import sys; from wimm.cli import cli\n'
+           'try:\n    cli()\nexcept SystemExit:\n    pass\n'
+           'print(",".join(m for m in %r if m in sys.modules), file=sys.stderr)'
+           % HEAVY)
+
+
+def import_time(module='wimm.cli'):
+    """ cumulative import time [s] reported by `python -X importtime` """
+
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                          f'import {module}'],
+                         capture_output=True, text=True, check=True)
+    for line in res.stderr.splitlines():
+        fields = [f.strip() for f in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1e6
+    raise ValueError(f'{module} not found in importtime output')
+
+
+def run_cli(args, env):
+    """ run the cli, return wall time [s] and heavy modules it imported """
+
+    t = time.perf_counter()
+    res = subprocess.run([sys.executable, '-c', RUN_CLI] + args, env=env,
+                         capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - t
+    loaded = res.stderr.strip().splitlines()[-1] if res.stderr.strip() else ''
+    return elapsed, [m for m in loaded.split(',') if m]
+
+
+def make_db(path):
+    """ minimal database folder for `wimm info` """
+    (path / structure.folders['WIMM']).mkdir()
+    yamlio.dump_file(path / structure.files['settings'], structure.settings)
+
+
+def main(repeat=5):
+
+    failed = False
+    best = min(import_time() for _ in range(repeat))
+    print(f'import wimm.cli: {best*1e3:.0f} ms')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_db(Path(tmp))
+        env = {**os.environ, 'WIMM_PATH': tmp}
+
+        for cmd, limit in LIMITS.items():
+            runs = [run_cli([cmd], env) for _ in range(repeat)]
+            best = min(elapsed for elapsed, _ in runs)
+            loaded = runs[0][1]
+
+            status = 'ok'
+            if loaded:
+                status = f'FAIL imports {", ".join(loaded)}'
+            elif best > limit:
+                status = f'FAIL slower than {limit*1e3:.0f} ms'
+            failed |= status != 'ok'
+            print(f'wimm {cmd}: {best*1e3:.0f} ms  {status}')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(v) for v in sys.argv[1:]]))
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite. Generates databases of several sizes (see
+`benchmarks.generator`), times scenarios on them and writes a json report.
+Reports of two versions can be compared to catch regressions.
+
+usage: python -m benchmarks.suite [--sizes 1000 100000] [--output report.json]
+                                  [--compare old.json] [--no-memory]
+"""
+import argparse
+import datetime as dt
+import gc
+import json
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import wimm
+import wimm.structure as structure
+from wimm import core
+from wimm.storage import SqliteStorage
+from benchmarks import generator, importers
+
+SIZES = (1_000, 100_000, 1_000_000)  # number of transfers
+MIN_TIME = 1.0  # repeat a scenario until it took this long in total
+THRESHOLD = 1.25  # slowdown reported as regression by `compare`
+MIN_SECONDS = 0.01  # faster scenarios are too noisy to compare
+
+
+class Scenarios:
+    """ scenarios on a generated database, methods named `bench_*`.
+    `setup_*` methods prepare data outside of the timing """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.trs_file = path / structure.files['transactions']
+        self.trs = core.Transactions.from_yaml(self.trs_file)
+        self.invs = core.Invoices.from_yaml(path / structure.files['invoices'])
+        self.start = core.load_start_balance(path / structure.files['balance'])
+
+    def bench_from_yaml(self):
+        core.Transactions.from_yaml(self.trs_file)
+
+    def bench_to_yaml(self):
+        self.trs.to_yaml(self.path / 'out.yaml')
+
+    def setup_balance(self):
+        self.trs._changed()  # drop the cached ledger
+
+    def bench_balance(self):
+        core.balance(self.trs, self.start)
+
+    def bench_balance_at(self):
+        core.balance(self.trs, self.start, date='2020-06-30')
+
+    def bench_to_df(self):
+        self.trs.to_df()
+
+    def setup_load_data_cached(self):
+        core.load_data('transactions', self.path)  # fill the cache
+
+    def bench_load_data_cached(self):
+        core.load_data('transactions', self.path)
+
+    def setup_load_split(self):
+        self.split_path = self.path / 'split'
+        if not self.split_path.exists():  # closed years in yearly files
+            self.split_path.mkdir()
+            shutil.copy(self.trs_file, self.split_path)
+            core.split_transactions(self.split_path, 2024)
+
+    def bench_load_split(self):
+        core.load_data('transactions', self.split_path, use_cache=False)
+
+    def setup_next_id(self):
+        self.invs._changed()  # drop the index
+
+    def bench_next_id(self):
+        for prefix in generator.PREFIXES:
+            for year in range(15, 25):
+                self.invs.get_next_id(f'{prefix}{year}')
+
+    def setup_sqlite_balance(self):
+        db = SqliteStorage(self.path)
+        db.save('balance', self.start)
+        db.save('transactions', self.trs)
+        db.close()
+
+    def bench_sqlite_balance(self):
+        db = SqliteStorage(self.path)
+        db.balance()
+        db.close()
+
+    def setup_asn_import(self):
+        self.asn_file = self.path / 'asn.csv'
+        importers.make_asn(self.asn_file, self.size // 2)
+
+    def bench_asn_import(self):
+        importers.asn_bank.Importer(self.asn_file).transactions()
+
+    def setup_knab_import(self):
+        self.knab_file = self.path / 'knab.csv'
+        importers.make_knab(self.knab_file, self.size // 2)
+
+    def bench_knab_import(self):
+        importers.knab_bank.knab_import(self.knab_file)
+
+    @classmethod
+    def names(cls):
+        return [k[6:] for k in dir(cls) if k.startswith('bench_')]
+
+
+def measure(scenarios, name, memory=True):
+    """ best time [s] of repeated runs and peak memory [MB] of one run """
+
+    setup = getattr(scenarios, 'setup_' + name, lambda: None)
+    bench = getattr(scenarios, 'bench_' + name)
+
+    times = []
+    while not times or (sum(times) < MIN_TIME and len(times) < 5):
+        setup()
+        gc.collect()
+        t = time.perf_counter()
+        bench()
+        times.append(time.perf_counter() - t)
+
+    peak = None
+    if memory:
+        setup()
+        gc.collect()
+        tracemalloc.start()
+        bench()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+
+    return {'seconds': min(times), 'runs': len(times), 'peak_mb': peak}
+
+
+def run(sizes=SIZES, names=None, memory=True):
+    """ run scenarios at all sizes, return the report """
+
+    names = names or Scenarios.names()
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = generator.generate(Path(tmp), transfers=size,
+                                      invoices=max(10, size // 100))
+            scenarios = Scenarios(path, size)
+            for name in names:
+                res = measure(scenarios, name, memory)
+                results.append({'scenario': name, 'transfers': size, **res})
+                mem = '' if res['peak_mb'] is None else f'{res["peak_mb"]:10.1f} MB'
+                print(f'{name:<20}{size:>10}{res["seconds"]:>10.3f} s{mem}',
+                      file=sys.stderr)
+
+    return {'wimm_version': wimm.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': dt.datetime.now().isoformat(timespec='seconds'),
+            'results': results}
+
+
+def compare(old, new, threshold=THRESHOLD):
+    """ print time ratios of two reports, return the regressions """
+
+    before = {(r['scenario'], r['transfers']): r['seconds']
+              for r in old['results']}
+    regressions = []
+    for r in new['results']:
+        key = (r['scenario'], r['transfers'])
+        if key not in before:
+            continue
+        ratio = r['seconds'] / before[key]
+        flag = ''
+        if ratio > threshold and r['seconds'] > MIN_SECONDS:
+            flag = 'REGRESSION'
+            regressions.append(key)
+        print(f'{key[0]:<20}{key[1]:>10}{before[key]:>10.3f} s'
+              f'{r["seconds"]:>10.3f} s{ratio:>8.2f}x {flag}')
+    return regressions
+
+
+def main(args=None):
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--scenarios', nargs='+', choices=Scenarios.names())
+    parser.add_argument('--output', '-o', help='write the json report here')
+    parser.add_argument('--compare', help='json report to compare with')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip peak memory measurement')
+    opts = parser.parse_args(args)
+
+    report = run(opts.sizes, opts.scenarios, not opts.no_memory)
+
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if opts.compare:
+        with open(opts.compare) as f:
+            old = json.load(f)
+        if compare(old, report):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
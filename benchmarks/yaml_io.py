@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark yaml loading and dumping of a transactions file,
+pure python vs libyaml (`wimm.yamlio`).
+
+usage: python -m benchmarks.yaml_io [nr_transactions]
+"""
+import io
+import sys
+import time
+
+import yaml
+import wimm.yamlio as yamlio
+from benchmarks.generator import make_transactions
+
+
+def timeit(fcn):
+    t = time.perf_counter()
+    res = fcn()
+    return time.perf_counter() - t, res
+
+
+def main(n=100_000):
+
+    data = make_transactions(n)
+    print(f'{n} transactions, libyaml: {yaml.__with_libyaml__}')
+
+    t_py, text = timeit(lambda: yaml.dump(data, sort_keys=False))
+    buf = io.StringIO()
+    t_c, _ = timeit(lambda: yamlio.dump(data, buf))
+    assert buf.getvalue() == text, 'output differs'
+    print(f'dump  python: {t_py:7.2f} s  yamlio: {t_c:7.2f} s  '
+          f'speedup: {t_py/t_c:.1f}x')
+
+    t_py, res_py = timeit(lambda: yaml.load(text, Loader=yaml.SafeLoader))
+    t_c, res_c = timeit(lambda: yamlio.load(text))
+    assert res_py == res_c, 'loaded data differs'
+    print(f'load  python: {t_py:7.2f} s  yamlio: {t_c:7.2f} s  '
+          f'speedup: {t_py/t_c:.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(v) for v in sys.argv[1:]])
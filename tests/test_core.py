@@ -6,8 +6,11 @@ This file is being used during module development.
 @author: jev
 """
 import pytest
+import numpy as np
+import pandas as pd
 # add wimm to path
 import os
+import shutil
 import sys
 from pathlib import Path
 cwd = Path(os.getcwd())
@@ -179,4 +182,808 @@ def test_invoice_transaction():
                        
     inv = core.Invoice(d)
     tr = inv.transaction()
-    print(tr)
\ No newline at end of file
+    print(tr)
+
+def test_ledger():
+    """ columnar ledger gives the same results as the records """
+
+    transactions = core.Transactions(structure.transactions)
+    ledger = transactions.ledger
+
+    assert len(ledger) == 6
+    assert ledger.accounts == ['Assets.Bank', 'Ext.Bob', 'Expenses', 'Liabilities']
+
+    df = transactions.to_df()
+    records = list(transactions.to_records())
+    assert df['account'].to_list() == [r['account'] for r in records]
+    assert df['amount'].to_list() == [r['amount'] for r in records]
+    assert df['date'].iloc[-1] == pd.Timestamp('2020-01-03')
+
+    df = transactions.to_df(('2020-01-02', '2020-01-03'))
+    assert len(df) == 2
+
+    for date_range in [('2020-01-02', None), (None, '2020-01-02'), (None, None)]:
+        selected = core.Transactions(core.Transactions.in_range(transactions, date_range))
+        assert len(transactions.to_df(date_range)) == len(selected.to_df()) > 0
+
+    accounts = transactions.process()
+    assert accounts['Assets.Bank'] == 1100
+    assert accounts.index.to_list() == sorted(accounts.index)
+
+    # cached ledger is dropped on change
+    transactions.append(core.Transaction(structure.transaction))
+    assert transactions.process()['CCC'] == -2
+
+
+def test_load_data_cache():
+    """ parsed data is cached in .wimm and refreshed on change """
+    from wimm.cache import FileCache
+
+    db = Path('tmp/db')
+    (db / structure.folders['WIMM']).mkdir(parents=True, exist_ok=True)
+    cache = FileCache(db / structure.folders['WIMM'] / 'cache')
+    cache.clear()
+
+    fname = db / structure.files['transactions']
+    core.Transactions(structure.transactions).to_yaml(fname)
+
+    trs = core.load_data('transactions', db)
+    assert len(trs) == 3
+    assert cache.entry_path(fname).exists()
+    assert cache.get(fname) == trs
+
+    # touching the file keeps the entry valid
+    os.utime(fname, ns=(0, 0))
+    assert cache.get(fname) == trs
+
+    with fname.open('a') as f:
+        f.write(core.Transaction(structure.transaction).to_yaml())
+
+    assert cache.get(fname) is None
+    trs = core.load_data('transactions', db)
+    assert len(trs) == 4
+    assert cache.get(fname) == trs
+
+
+def test_load_data_appended():
+    """ only the appended part of transactions.yaml is parsed """
+    from wimm.cache import FileCache
+
+    db = Path('tmp/db')
+    (db / structure.folders['WIMM']).mkdir(parents=True, exist_ok=True)
+    cache = FileCache(db / structure.folders['WIMM'] / 'cache')
+    cache.clear()
+
+    fname = db / structure.files['transactions']
+    core.Transactions(structure.transactions).to_yaml(fname)
+    core.load_data('transactions', db)
+
+    with fname.open('a') as f:
+        f.write('\n# ---IMPORT--- test\n')
+        f.write(core.Transaction(structure.transaction).to_yaml())
+
+    calls = []
+    loader = core.Transactions.from_yaml
+    core.Transactions.from_yaml = lambda p: calls.append(p) or loader(p)
+    try:
+        trs = core.load_data('transactions', db)
+        assert calls == []  # no full parse
+        assert len(trs) == 4
+        assert trs.ledger._totals is not None
+        assert trs.process().equals(core.Transactions(trs.data).process())
+
+        # changing existing data triggers a full parse
+        core.Transactions(structure.transactions[:2]).to_yaml(fname)
+        with fname.open('a') as f:
+            f.write(core.Transaction(structure.transaction).to_yaml())
+        trs = core.load_data('transactions', db)
+        assert len(calls) == 1
+        assert len(trs) == 3
+    finally:
+        core.Transactions.from_yaml = loader
+
+
+def test_yamlio():
+    """ output is identical to the python dumper """
+    import io
+    import yaml
+    import wimm.yamlio as yamlio
+
+    data = structure.transactions + [
+        {'date': '2020-01-01', 'description': 'long text é ' + 'x' * 100,
+         'transfers': {'': 1.5, 'A.B': None}}]
+
+    expected = yaml.dump(data, sort_keys=False)
+    assert yamlio.dump(data) == expected
+
+    # written in chunks
+    chunk_size = yamlio.CHUNK_SIZE
+    yamlio.CHUNK_SIZE = 2
+    buf = io.StringIO()
+    yamlio.dump((d for d in data), buf)
+    yamlio.CHUNK_SIZE = chunk_size
+    assert buf.getvalue() == expected
+
+    assert yamlio.load(expected) == data
+
+
+def test_transactions_streaming():
+    """ read transactions one by one """
+
+    fname = 'tmp/transactions.yaml'
+    core.Transactions(structure.transactions).to_yaml(fname)
+
+    trs = list(core.Transactions.iter_yaml(fname))
+    assert trs == core.Transactions.from_yaml(fname).data
+
+    trs = list(core.Transactions.iter_yaml(fname, ('2020-01-02', None)))
+    assert [tr.date for tr in trs] == ['2020-01-02', '2020-01-03']
+
+    chunks = list(core.Transactions.iter_chunks(fname, chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 1]
+
+    accounts = core.stream_balance(fname, chunk_size=2)
+    assert accounts.equals(core.Transactions.from_yaml(fname).process())
+
+    accounts = core.stream_balance(fname, ('2020-01-01', '2020-01-02'))
+    assert accounts['Assets.Bank'] == 1000
+
+
+def test_records():
+    """ slotted Transaction and Invoice behave like dicts """
+    import pickle
+
+    tr = core.Transaction(date='2020-01-01', category='office',
+                          transfers={'A': 1, 'B': None})
+    assert list(tr) == ['date', 'description', 'transfers', 'category']
+    assert tr.category == 'office'
+    assert tr['transfers']['B'] == -1
+    assert not hasattr(tr, '__dict__')
+
+    inv = core.Invoice(id='INR20_001', amount=10)
+    assert inv['from'] == 'Uncategorized'
+    inv['to'] = 'Bob'
+    assert inv.to == 'Bob'
+    del inv['tax']
+    assert 'tax' not in inv and len(inv) == 9
+    with pytest.raises(AttributeError):
+        inv.amount_payed
+
+    assert pickle.loads(pickle.dumps(inv)) == inv
+    assert pickle.loads(pickle.dumps(tr)) == tr
+    assert inv.copy() == inv and inv.copy() is not inv
+
+
+def test_account_tree():
+    """ tree balances are the same as grouping by labels """
+
+    accounts = pd.Series({'Assets': 1.0, 'Assets.Bank.ASN': 10.0,
+                          'Assets.Bank.KNAB': 5.0, 'Assets.Cash': 2.0,
+                          'Ext.Bob': -18.0, 'Expenses': 0.0})
+    tree = core.account_tree(accounts)
+
+    for depth in [1, 2, 3, 4]:
+        labels = utils.names_to_labels(accounts.index.to_list(), depth)
+        expected = accounts.groupby(labels).sum()
+        assert tree.balance(depth).to_dict() == expected.to_dict()
+
+    assert tree.balance().to_dict() == accounts.to_dict()
+    assert tree.totals['Assets.Bank'] == 15
+
+    res = tree.balance(account='Assets.Bank.*')
+    assert res.index.to_list() == ['Assets.Bank.ASN', 'Assets.Bank.KNAB']
+    assert tree.balance(2, account='Assets').to_dict() == {
+        'Assets': 1.0, 'Assets.Bank': 15.0, 'Assets.Cash': 2.0}
+
+    assert 'Expenses' not in tree.balance(1, nozeros=True)
+    with pytest.raises(KeyError):
+        tree.balance(account='Foo')
+
+    # empty name parts are accounts too, they do not collide with the root
+    accounts = pd.Series({'': 1.0, '.Bank': 2.0, 'Ext.': 3.0, 'Ext..Bob': 4.0})
+    tree = core.account_tree(accounts)
+    for depth in [None, 1, 2, 3]:
+        labels = utils.names_to_labels(accounts.index.to_list(), depth or 3)
+        expected = accounts.groupby(labels).sum()
+        assert tree.balance(depth).to_dict() == expected.to_dict()
+
+
+def test_snapshots():
+    """ balances at a date and for a period """
+
+    data = [{'date': f'2020-{m:02d}-{d:02d}',
+             'transfers': {'Assets.Bank': float(m * d), 'Ext': None}}
+            for m in range(1, 13) for d in (1, 15, 28)]
+    data.append({'date': None, 'transfers': {'Old': 1.0, 'Ext': -1.0}})
+    ledger = core.Transactions(data).ledger
+    df = ledger.to_df()
+    bank = df[df.account == 'Assets.Bank']
+
+    for date in ['2019-12-31', '2020-01-01', '2020-03-14', '2020-03-15',
+                 '2020-12-31', '2021-06-01']:
+        res = ledger.balance_at(date)
+        assert res['Assets.Bank'] == bank.amount[bank.date <= date].sum()
+        assert res['Old'] == 1.0
+        assert res.sum() == 0
+
+    for freq in ['MS', 'QS', '7D']:
+        res = ledger.period_balance('2020-02-15', '2020-06-01', freq=freq)
+        mask = (bank.date >= '2020-02-15') & (bank.date < '2020-06-01')
+        assert res['Assets.Bank'] == bank.amount[mask].sum()
+
+    assert ledger.period_balance().equals(ledger.balance())
+
+    trs = core.Transactions(structure.transactions)
+    res = core.balance(trs, pd.Series({'Assets.Bank': 10.0}), date='2020-01-02')
+    assert res['Assets.Bank'] == 960
+
+
+def test_asn_import():
+    """ ASN statement to transactions """
+    from wimm.importers import asn_bank
+
+    row = ['2021-04-20', 'NL01ASNB', 'NL02BANK', 'N.S. Reizigers', '', '', '',
+           'EUR', '100', 'EUR', '-12.5', '', '', '', '', '', '', "'ticket'", '1']
+    fname = 'tmp/asn.csv'
+    with open(fname, 'w') as f:
+        f.write(','.join(row) + '\n')
+        row[3] = ''  # no name
+        f.write(','.join(row) + '\n')
+
+    importer = asn_bank.Importer(fname)
+    trs = importer.transactions()
+    chunks = list(importer.iter_transactions(chunksize=1))
+    assert [len(c) for c in chunks] == [1, 1]
+    assert chunks[0] + chunks[1] == trs
+
+    assert trs[0].to_dict() == {'date': '2021-04-20', 'description': 'ticket',
+                                'transfers': {'Assets.Bank.ASN': -12.5,
+                                              'Ext.NS_Reizigers': 12.5}}
+    assert 'Ext.unknown' in trs[1].transfers
+
+
+def test_hasher():
+    """ file hashes are kept in a set """
+
+    folder = Path('tmp/docs')
+    folder.mkdir(parents=True, exist_ok=True)
+    files = []
+    for i in range(3):
+        files.append(folder / f'doc{i}.txt')
+        files[-1].write_text(f'document {i % 2}')
+
+    hsh = utils.Hasher('tmp/hashes')
+    hsh.delete_hashes()
+    hsh.add(files[0])
+    assert hsh.are_present(files) == [True, False, True]
+
+    hsh.add(folder, files[1])
+    assert len(hsh.hashes) == 2
+    assert len(Path('tmp/hashes').read_text().split()) == 2
+    assert utils.Hasher('tmp/hashes').hashes == hsh.hashes
+    assert hsh.is_present(files[1])
+
+    assert utils.file_md5s(files, workers=2) == utils.file_md5s(files, 1)
+    assert utils.md5(folder, workers=3) == [utils.file_md5(f)
+                                            for f in folder.glob('*')]
+
+
+def test_invoice_index():
+    """ index is kept up to date """
+
+    invoices = structure.invoices()
+    assert invoices.get_next_id('INR21') == 'INR21_004'
+    assert invoices.get_by_id('INR21_001')['to'] == 'Alice'
+
+    invoices.append(core.Invoice(id='INR21_010', amount=1))
+    assert invoices.get_next_id('INR') == 'INR21_011'
+    assert invoices.get_by_id('INR21_010')['amount'] == 1
+    assert [inv['id'] for inv in invoices.get_by_id('INR21*')] == [
+        'INR21_001', 'INR21_003', 'INR21_010']
+
+    del invoices[-1]
+    assert invoices.get_next_id('INR') == 'INR21_004'
+    with pytest.raises(KeyError):
+        invoices.get_by_id('INR21_010')
+
+
+def test_invoices_to_transactions():
+    """ bulk conversion gives the same transactions as single invoices """
+
+    invoices = structure.invoices()
+    invoices.append(core.Invoice(id='FOO20_001', amount=5, tax=1,
+                                 date='2020-03-01'))
+    trs = invoices.to_transactions()
+
+    assert len(trs) == len(invoices)
+    for inv, tr in zip(invoices, trs):
+        assert inv.transaction() == tr
+        assert tr.description == 'Invoice ' + inv.id
+
+    assert trs[1].transfers == {'MyCompany.INR.INR20_001': -70, 'Bob': 70,
+                                'Taxes': -10,
+                                'MyCompany.tax.to_receive': 10}
+    assert trs[-1].transfers == {'Uncategorized': 0}
+
+    ledger = invoices.to_ledger()
+    assert ledger.balance().to_dict() == pytest.approx(trs.process().to_dict())
+
+    accounts = core.balance(core.Transactions(), invoices=invoices)
+    # exact in cents, a float sum of 36.3 and -16.3 is not exactly 20
+    assert utils.to_cents(accounts).sum() == 0
+    assert accounts['MyCompany.tax.to_receive'] == 36.3
+    assert accounts['Alice'] == 1025
+
+
+def test_receivables():
+    """ payments are matched on id or on amount and counterparty """
+    from wimm.receivables import Receivables
+
+    invoices = core.Invoices([
+        core.Invoice(id='INS20_001', amount=100, date='2020-01-01',
+                     due_date='2020-01-31', ext_name='Customer X'),
+        core.Invoice(id='INS20_002', amount=50, date='2020-02-01',
+                     due_date='2020-03-02', ext_name='Customer Y'),
+        core.Invoice(id='INR20_001', amount=20, date='2020-03-01',
+                     due_date='2020-03-31', ext_name='Shop')])
+    for inv in invoices:
+        inv.set_accounts()
+
+    transactions = core.Transactions([
+        core.Transaction(date='2020-01-01', description='Invoice INS20_001',
+                         transfers={'MyCompany.INS.INS20_001': 100, 'Sales': -100}),
+        core.Transaction(date='2020-01-10', description='part of INS20_001',
+                         transfers={'Assets.Bank': 60, 'Ext.Customer_X': -60}),
+        core.Transaction(date='2020-01-20', description='payment',
+                         transfers={'Assets.Bank': 40, 'Ext.Customer_X': -40}),
+        core.Transaction(date='2020-02-10', description='unrelated, same amount',
+                         transfers={'Assets.Bank': 50, 'Ext.Other': -50}),
+        core.Transaction(date='2020-02-11', description='refers to INS20_002',
+                         transfers={'Assets.Bank': 50, 'Ext.Other': -50}),
+        core.Transaction(date='2020-03-10', description='groceries',
+                         transfers={'Assets.Bank': -20, 'Ext.Shop': 20})])
+
+    rec = Receivables(invoices, transactions)
+    assert rec.paid().to_dict() == {'INS20_001': 100, 'INR20_001': 20}
+    assert rec.payments['INS20_001'] == [('2020-01-10', 60),
+                                         ('2020-01-20', 40)]
+
+    df = rec.open_invoices()
+    assert df['id'].tolist() == ['INS20_002']
+    assert invoices[1].rest_amount(10) == 40
+
+    aging = rec.aging('2020-04-15')
+    assert aging.loc['31-60', 'count'] == 1
+    assert aging.loc['31-60', 'sum'] == 50
+    assert aging['sum'].sum() == 50
+
+    # payments add up in cents: 0.1 + 0.2 pays 0.3
+    small = core.Invoices([core.Invoice(id='INS20_003', amount=0.3, date='2020-04-01',
+                                        ext_name='Customer Z')])
+    small[0].set_accounts()
+    rec = Receivables(small, core.Transactions([
+        core.Transaction(date='2020-04-02', description=f'INS20_003 part {i}',
+                         transfers={'Assets.Bank': v, 'Ext.Customer_Z': -v})
+        for i, v in enumerate((0.1, 0.2))]))
+    assert rec.paid().to_dict() == {'INS20_003': 0.3}
+    assert rec.open_invoices().empty
+
+
+def test_sqlite_storage():
+    """ yaml data survives a roundtrip through sqlite """
+    from wimm.storage import SqliteStorage, YamlStorage
+
+    db = Path('tmp/sqlite')
+    db.mkdir(parents=True, exist_ok=True)
+    trs = core.Transactions(structure.transactions)
+    trs[0]['tag'] = 'extra key'
+    trs.to_yaml(db / structure.files['transactions'])
+    structure.invoices().to_yaml(db / structure.files['invoices'])
+    utils.save_yaml(db / structure.files['balance'], {'Assets.Bank': 10.0},
+                    ask_confirmation=False)
+    yaml_files = {name: (db / structure.files[name]).read_text()
+                  for name in ['balance', 'transactions', 'invoices']}
+
+    (db / structure.files['sqlite']).unlink(missing_ok=True)
+    sql = SqliteStorage(db)
+    sql.import_yaml()
+    ys = YamlStorage(db)
+
+    assert sql.load('transactions') == ys.load('transactions')
+    assert sql.load('invoices') == ys.load('invoices')
+    assert sql.balance().to_dict() == ys.balance().to_dict()
+    assert sql.balance('2020-01-02').to_dict() == \
+        ys.balance('2020-01-02').to_dict()
+    for date in (None, '2020-01-02'):  # invoices are added in cents
+        assert sql.balance(date, with_invoices=True).to_dict() == \
+            ys.balance(date, with_invoices=True).to_dict()
+
+    dates = [tr['date'] for tr in sql.iter_transactions(('2020-01-02', None))]
+    assert dates == ['2020-01-02', '2020-01-03']
+
+    sql.append('transactions', [structure.transaction])
+    assert sql.load('transactions')[-1]['transfers']['CCC'] == -2
+
+    undated = {'date': None, 'transfers': {'Assets.Bank': 5, 'Ext.Old': -5}}
+    sql.append('transactions', [undated])
+    ys.append('transactions', [structure.transaction, undated])
+    for date in ['2019-12-31', '2020-01-02']:
+        assert sql.balance(date).to_dict() == ys.balance(date).to_dict()
+    assert sql.balance('2019-12-31')['Assets.Bank'] == 15
+
+    sql.save('transactions', trs)
+    sql.export_yaml()
+    for name, text in yaml_files.items():
+        assert (db / structure.files[name]).read_text() == text
+    sql.close()
+
+
+def test_cli_lazy_imports():
+    """ starting the cli does not import pandas """
+    import subprocess
+
+    code = ('import sys, wimm.cli; '
+            'print(",".join(m for m in ["pandas", "numpy", "wimm.core"] '
+            'if m in sys.modules))')
+    root = Path(__file__).resolve().parents[1]
+    res = subprocess.run([sys.executable, '-c', code], cwd=root,
+                         capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == ''
+
+
+def test_cli_balance_options():
+    """ a balance at a date and changes in a period are exclusive """
+    from click.testing import CliRunner
+    from wimm.cli import cli
+
+    res = CliRunner().invoke(cli, ['--local', 'show', 'balance', '--at',
+                                   '2020-01-01', '--from', '2019-01-01'])
+    assert res.exit_code == 2 and '--at can not be combined' in res.output
+
+
+def test_server():
+    """ reports from the server are the same as local ones """
+    import io
+    import threading
+    from wimm import reports, server
+    from wimm.storage import YamlStorage
+
+    db = Path('tmp/server').absolute()
+    (db / structure.folders['WIMM']).mkdir(parents=True, exist_ok=True)
+    core.Transactions(structure.transactions).to_yaml(
+        db / structure.files['transactions'])
+    structure.invoices().to_yaml(db / structure.files['invoices'])
+    utils.save_yaml(db / structure.files['balance'], structure.accounts,
+                    ask_confirmation=False)
+
+    storage = YamlStorage(db)
+    assert not server.request(db, 'invoices', {}, io.StringIO())
+
+    path = server.socket_path(db)
+    path.unlink(missing_ok=True)
+    with server.ReportServer(path, storage) as srv:
+        thread = threading.Thread(target=srv.serve_forever)
+        thread.start()
+        try:
+            for name, options in [('balance', {'depth': 1}),
+                                  ('invoices', {}),
+                                  ('transactions', {'start': '2020-01-02'})]:
+                remote, local = io.StringIO(), io.StringIO()
+                assert server.request(db, name, options, remote)
+                reports.REPORTS[name](YamlStorage(db), local, **options)
+                assert remote.getvalue() == local.getvalue() != ''
+
+            with pytest.raises(server.ServerError):
+                server.request(db, 'balance', {'account': 'Nope'},
+                               io.StringIO())
+        finally:
+            srv.shutdown()
+            thread.join()
+    path.unlink()
+
+
+def test_invoice_views():
+    """ pages of sorted and filtered invoices """
+    from wimm.views import InvoiceViews
+
+    invoices = structure.invoices()
+    views = InvoiceViews(invoices)
+
+    page = views.query('amount', per_page=2)
+    assert page.total == len(invoices) and page.pages == 3
+    assert [inv['amount'] for inv in page.items] == sorted(
+        inv['amount'] for inv in invoices)[:2]
+
+    page = views.query('date', reverse=True, page=3, per_page=2)
+    assert page.items == invoices.get_sorted_by('date', reverse=True)[4:]
+
+    page = views.query(prefix='INR21')
+    assert [inv['id'] for inv in page.items] == ['INR21_001', 'INR21_003']
+    assert views.query(search='ALICE').total == 2
+    assert views.query(search='nothing like this').items == []
+
+    with pytest.raises(KeyError):
+        views.query('attachment')
+
+    for per_page in (0, -5):  # page sizes are clamped
+        page = views.query(per_page=per_page)
+        assert page.per_page == 1 and page.pages == len(invoices)
+        assert len(page.items) == 1
+
+
+def test_api_page_size():
+    """ invalid parameters do not break the json api """
+    for module in ('flask', 'flask_table', 'flask_dropzone'):
+        pytest.importorskip(module)
+
+    db = Path('tmp/api').absolute()
+    (db / structure.folders['WIMM']).mkdir(parents=True, exist_ok=True)
+    utils.save_yaml(db / structure.files['settings'], structure.settings,
+                    ask_confirmation=False)
+    utils.save_yaml(db / structure.files['balance'], structure.accounts,
+                    ask_confirmation=False)
+    core.Transactions(structure.transactions).to_yaml(
+        db / structure.files['transactions'])
+    structure.invoices().to_yaml(db / structure.files['invoices'])
+
+    os.environ['WIMM_PATH'] = str(db)
+    sys.path.insert(0, (Path(__file__).resolve().parents[1] / 'app').as_posix())
+    try:
+        import app as web
+    finally:
+        sys.path.pop(0)
+        del os.environ['WIMM_PATH']
+        wimm.settings = structure.settings
+
+    client = web.app.test_client()
+    for url in ('/api/invoices?per_page=0', '/api/invoices?per_page=-3',
+                '/api/transactions?per_page=0'):
+        res = client.get(url)
+        assert res.status_code == 200
+        assert len(res.get_json()['items']) == 1
+
+    for url in ('/api/balance?date=2020-13-01', '/api/balance?account=Foo',
+                '/api/transactions?from=yesterday', '/api/transactions?to=2020'):
+        res = client.get(url)
+        assert res.status_code == 400 and 'error' in res.get_json()
+
+    res = client.get('/api/balance?date=2020-01-02&account=Assets')
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data['sum'] == round(sum(data['accounts'].values()), 2)
+
+
+def test_transaction_views():
+    """ transactions selected on date and account, data versions """
+    from wimm.views import TransactionViews, data_version
+    from wimm.storage import YamlStorage
+
+    trs = core.Transactions(structure.transactions)
+    views = TransactionViews(trs)
+    assert views.query().total == 3
+    assert views.query(start='2020-01-02').items == trs[1:]
+    assert views.query(account='Assets.*', end='2020-01-03').items == trs[:2]
+    assert views.query(account='Assets.Bank', per_page=2, page=2).items == trs[2:]
+    assert views.query(account='Ext').items == trs[:1]
+    assert views.query(account='Ex').total == 0
+
+    db = Path('tmp/views')
+    db.mkdir(parents=True, exist_ok=True)
+    fname = db / structure.files['transactions']
+    trs.to_yaml(fname)
+    storage = YamlStorage(db)
+    etag, modified = data_version(storage, ['transactions'])
+    assert data_version(storage, ['transactions']) == (etag, modified)
+
+    with fname.open('a') as f:
+        f.write(core.Transaction(structure.transaction).to_yaml())
+    assert data_version(storage, ['transactions'])[0] != etag
+
+
+def test_profiling():
+    """ stages are recorded between start and report """
+    import io
+    import json
+    from wimm import profiling
+
+    db = Path('tmp/profiling')
+    db.mkdir(parents=True, exist_ok=True)
+    core.Transactions(structure.transactions).to_yaml(
+        db / structure.files['transactions'])
+
+    with profiling.stage('not recorded'):
+        pass
+
+    recorder = profiling.start(memory=True)
+    with profiling.stage('outer'):
+        trs = core.load_data('transactions', db, use_cache=False)
+        core.balance(trs, pd.Series(structure.accounts))
+
+    names = [(st.level, st.name) for st in recorder.stages]
+    assert names[:5] == [(0, 'outer'), (1, 'load transactions'),
+                         (2, 'parse files'), (3, 'parse'), (3, 'build')]
+    assert (1, 'aggregate') in names
+    load = recorder.stages[1]
+    assert load.count == 3
+    assert recorder.stages[0].peak >= load.peak > 0
+
+    stream = io.StringIO()
+    profiling.report('json', stream)
+    data = json.loads(stream.getvalue())
+    assert [st['name'] for st in data['stages']] == [n for _, n in names]
+    assert profiling.stage('after') is profiling._NULL
+
+
+def test_empty_start_balance():
+    """ an empty balance file gives an empty Series, also when profiling """
+    import io
+    from wimm import profiling
+
+    db = Path('tmp/empty_balance')
+    db.mkdir(parents=True, exist_ok=True)
+    fname = db / structure.files['balance']
+    fname.write_text('')
+    assert core.load_start_balance(fname).empty
+
+    recorder = profiling.start()
+    assert core.load_start_balance(fname).empty
+    assert recorder.stages[0].count == 0
+    profiling.report(stream=io.StringIO())
+
+
+def test_split_transactions():
+    """ closed years in yearly files give the same data """
+    from wimm.storage import YamlStorage
+    import wimm.yamlio as yamlio
+
+    db = Path('tmp/split')
+    if db.exists():
+        shutil.rmtree(db)
+    (db / structure.folders['WIMM']).mkdir(parents=True)
+    data = [{'date': f'{year}-0{month}-01', 'description': f'{year} {month}',
+             'transfers': {'Assets.Bank': 10.0 * month, f'Ext.{year}': None}}
+            for year in (2019, 2020, 2021) for month in (1, 5)]
+    fname = db / structure.files['transactions']
+    core.Transactions(data).to_yaml(fname)
+    before = core.load_data('transactions', db, use_cache=False)
+
+    assert core.split_transactions(db, 2021) == {'2019': 2, '2020': 2}
+    assert core.split_transactions(db, 2021) == {}
+    folder = db / structure.folders['transactions']
+    assert sorted(p.name for p in folder.iterdir()) == ['2019.yaml', '2020.yaml']
+    assert core.transaction_files(db, ('2020-03-01', None)) == [
+        folder / '2020.yaml', fname]
+
+    for use_cache in (False, True, True):  # parse, fill cache, use cache
+        trs = core.load_data('transactions', db, use_cache)
+        assert [tr.to_dict() for tr in trs] == [tr.to_dict() for tr in before]
+        assert trs.process().equals(before.process())
+    pooled = core._load_transaction_files(core.transaction_files(db), workers=2)
+    assert [tr.to_dict() for tr in pooled] == [tr.to_dict() for tr in before]
+
+    storage = YamlStorage(db)
+    new = core.Transaction(structure.transaction)
+    storage.append('transactions', [new])
+    trs = storage.load('transactions')
+    assert len(trs) == 7 and trs.ledger.totals().sum() == pytest.approx(0)
+    assert [tr['description'] for tr in YamlStorage(db).iter_transactions(
+        ('2020-01-01', '2021-01-01'))] == ['2020 1', '2020 5', new['description']]
+
+    # an sqlite export keeps the closed years apart
+    from wimm.storage import SqliteStorage
+    utils.save_yaml(db / structure.files['balance'], structure.accounts,
+                    ask_confirmation=False)
+    structure.invoices().to_yaml(db / structure.files['invoices'])
+    sql = SqliteStorage(db)
+    sql.import_yaml()
+    sql.export_yaml()
+    sql.close()
+    assert sorted(p.name for p in folder.iterdir()) == ['2019.yaml', '2020.yaml']
+    assert [tr['description'] for tr in core.Transactions.from_yaml(fname)] == [
+        '2021 1', '2021 5']
+    assert sorted(tr['description'] for tr in core.load_data('transactions', db)) \
+        == sorted(tr['description'] for tr in trs)
+
+    # splitting everything leaves a file that can be appended to
+    assert core.split_transactions(db, 2022) == {'2021': 2}
+    assert fname.read_text() == ''
+    YamlStorage(db).append('transactions', [new])
+    assert [tr['description'] for tr in core.Transactions.from_yaml(fname)] == [
+        new['description']]
+    assert [d['description'] for d in yamlio.iter_file(fname)] == [
+        new['description']]
+    assert len(core.load_data('transactions', db, use_cache=False)) == 8
+
+
+def test_close_period(monkeypatch):
+    """ closed transactions move to the start balance and the archive """
+    from click.testing import CliRunner
+    from wimm.closing import close_period, full_balance
+    import wimm.cli
+
+    db = Path('tmp/closing')
+    if db.exists():
+        shutil.rmtree(db)
+    (db / structure.folders['WIMM']).mkdir(parents=True)
+    utils.save_yaml(db / structure.files['balance'], {'Assets.Bank': 100.0},
+                    ask_confirmation=False)
+    data = [{'date': f'{year}-06-0{day}', 'description': f'{year} {day}',
+             'transfers': {'Assets.Bank': 0.1 * day, f'Ext.{day}': None}}
+            for year in (2019, 2020) for day in (1, 2, 3)]
+    core.Transactions(data).to_yaml(db / structure.files['transactions'])
+    core.split_transactions(db, 2020)
+    before = full_balance(db)
+
+    archive, count = close_period(db, '2020-06-01')
+    assert count == 4 and len(core.load_data('transactions', db)) == 2
+    assert not (db / structure.folders['transactions'] / '2019.yaml').exists()
+    assert len(core.Transactions.from_yaml(archive)) == 4
+    start = core.load_start_balance(db / structure.files['balance'])
+    assert start['Assets.Bank'] == 100.7 and start['Ext.1'] == -0.2
+    assert full_balance(db).equals(before)
+
+    with pytest.raises(FileExistsError):
+        close_period(db, '2020-06-01')
+    with pytest.raises(ValueError):
+        close_period(db, '2020-01-01')
+    monkeypatch.setattr(wimm.cli, 'PATH', db)
+    for date in ('2020-06-01', '2020-01-01'):  # errors without a traceback
+        res = CliRunner().invoke(wimm.cli.cli, ['close-period', date], input='y\n')
+        assert res.exit_code == 1 and res.output.splitlines()[-1].startswith('Error:')
+
+    archive, count = close_period(db, '2021-01-01')  # nothing left open
+    assert count == 2 and core.load_data('transactions', db) == []
+    with (db / structure.files['transactions']).open('a') as f:  # cli append
+        f.write(core.Transaction(structure.transaction).to_yaml())
+    assert len(core.load_data('transactions', db)) == 1
+
+
+def test_cents():
+    """ amounts are summed as integer cents """
+    from wimm import reports
+    from wimm.storage import YamlStorage
+    import io
+
+    assert utils.to_cents(0.1) == 10 and utils.to_cents(-19.999) == -2000
+    assert utils.to_cents([0.125, -0.125, 0.29]).tolist() == [13, -13, 29]
+    assert utils.to_cents(0.125) == 13 and utils.to_cents(-0.005) == -1
+    assert utils.whole_cents([0.29, 1e6 + 0.01]) and not utils.whole_cents(0.001)
+    assert utils.tax(121) == 21 and utils.tax(10) == 1.74
+    for missing in (float('nan'), [1.0, None], pd.Series({'A': 1.0, 'B': None})):
+        with pytest.raises(ValueError, match='missing amount'):
+            utils.to_cents(missing)
+    with pytest.raises(ValueError, match='for B'):  # empty value in balance.yaml
+        core.balance(core.Transactions(), pd.Series({'A': 1.0, 'B': None}))
+    for amount in (0.01, 9.99, 100.05, 1234.57):
+        assert utils.to_cents(amount - utils.tax(amount)) + \
+            utils.to_cents(utils.tax(amount)) == utils.to_cents(amount)
+
+    trs = core.Transactions([{'date': '2020-01-01', 'transfers': {
+        'A': 0.1, 'B': 0.2, 'C': None}}] * 10)
+    assert trs[0].transfers['C'] == -0.3 and trs[0].is_balanced()
+    assert trs.ledger.totals().dtype == np.int64
+    assert trs.ledger.totals().tolist() == [100, 200, -300]
+    assert trs.process().to_dict() == {'A': 1.0, 'B': 2.0, 'C': -3.0}
+
+    unbalanced = core.Transaction(date='2020-01-02', transfers={'A': 1, 'B': -0.99})
+    assert not unbalanced.is_balanced()
+    trs.append(unbalanced)
+    assert trs.unbalanced() == [unbalanced]
+
+    db = Path('tmp/cents')
+    db.mkdir(parents=True, exist_ok=True)
+    utils.save_yaml(db / structure.files['balance'], {'A': 0.7},
+                    ask_confirmation=False)
+    trs[:10].to_yaml(db / structure.files['transactions'])
+    storage = YamlStorage(db)
+    with pytest.raises(ValueError):
+        storage.append('transactions', [unbalanced])
+    with pytest.raises(ValueError):  # fractions of a cent
+        storage.append('transactions', [{'date': '2020-01-03', 'transfers': {
+            'A': 0.001, 'B': -0.001}}])
+    with pytest.warns(UserWarning):
+        core.Transactions([{'transfers': {'A': 0.125, 'B': None}}]).ledger
+
+    stream = io.StringIO()
+    reports.balance(storage, stream, depth=1)
+    assert stream.getvalue().splitlines()[-1] == 'SUM: 0.70'
@@ -1,6 +1,5 @@
 from pathlib import Path
 import os
-import yaml
 import wimm.structure as structure
 
 
@@ -21,6 +20,7 @@ def get_path():
 
 def get_settings():
     """ get settings from file or defaults """
+    import wimm.yamlio as yamlio
 
     path = get_path()
 
@@ -30,7 +30,7 @@ def get_settings():
     p = path / structure.files['settings']
     assert p.exists(), f'no settings file in {p.as_posix()}'
 
-    settings = yaml.load(p.open(), Loader=yaml.SafeLoader)
+    settings = yamlio.load_file(p)
     settings['path'] = path
 
     return settings
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Account tree
+=============
+
+Account names use the dot notation (see `core.parse_account`), so accounts
+form a tree. `AccountTree` stores the balance of every account and the
+subtotal of every node, including parents that are not accounts themselves.
+Balances at any depth or of any subtree are read from the tree without
+summing again. Subtotals are summed in cents, so they are exact.
+
+"""
+import pandas as pd
+import wimm.core as core
+from wimm.utils import CENTS, to_cents
+
+SEP = '.'
+ROOT = None  # parent of the top level accounts, not an account name
+
+
+class AccountTree:
+    """ account balances with subtotals for all parent accounts """
+
+    def __init__(self, balances):
+        """ build from a Series of account balances """
+
+        own = {}  # balance of an account, in cents
+        totals = {}  # balance of a node including its subaccounts, in cents
+        self.depth = {}
+        self.children = {ROOT: set()}
+
+        children, depth = self.children, self.depth
+        values = to_cents(balances.values).tolist()
+        for name, value in zip(balances.index, values):
+            parent = ROOT
+            for level, part in enumerate(core.parse_account(name), 1):
+                node = part if parent is ROOT else parent + SEP + part
+                if node in totals:
+                    totals[node] += value
+                else:
+                    totals[node] = value
+                    depth[node] = level
+                    children[parent].add(node)
+                    children[node] = set()
+                parent = node
+            own[parent] = own.get(parent, 0) + value
+
+        self.own = {k: v / CENTS for k, v in own.items()}
+        self.totals = {k: v / CENTS for k, v in totals.items()}
+        self._cache = {}
+
+    def __contains__(self, node):
+        return node in self.totals
+
+    def _walk(self, node, max_depth):
+        """ yield nodes below `node`, down to `max_depth` """
+        for child in self.children[node]:
+            yield child
+            if max_depth is None or self.depth[child] < max_depth:
+                yield from self._walk(child, max_depth)
+
+    def subtree(self, account):
+        """ nodes of a subtree, `account` may end with `.*` """
+        account = account[:-2] if account.endswith(SEP + '*') else account
+        if account not in self:
+            raise KeyError(f'account {account} not found')
+        return [account] + list(self._walk(account, None))
+
+    def balance(self, depth=None, account=None, nozeros=False):
+        """ account balances, sorted by name
+
+        Parameters
+        ----------
+        depth : int, optional
+            collapse subaccounts deeper than `depth` into their parent.
+            Accounts with a lower depth keep their own balance.
+        account : str, optional
+            only show this account and its subaccounts, like `Assets.Bank.*`
+        nozeros : bool
+            drop zero balances
+        """
+
+        key = (depth, account)
+        if key not in self._cache:
+
+            if account is None:
+                nodes = self._walk(ROOT, depth)
+            else:
+                nodes = [n for n in self.subtree(account)
+                         if depth is None or self.depth[n] <= depth]
+
+            names, values = [], []
+            for node in nodes:
+                if depth is not None and self.depth[node] == depth:
+                    names.append(node)
+                    values.append(self.totals[node])
+                elif node in self.own:
+                    names.append(node)
+                    values.append(self.own[node])
+
+            s = pd.Series(values, index=names, name='amount', dtype=float)
+            self._cache[key] = s.sort_index()
+
+        s = self._cache[key]
+        return s[s != 0] if nozeros else s
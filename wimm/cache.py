@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache for parsed data files
+============================
+
+Parsing yaml is slow for large databases. Parsed objects are pickled to the
+`.wimm/cache` folder together with a fingerprint of the source file.
+
+A cache entry is valid when the size and modification time of the source
+match. If only the modification time differs, the md5 hash decides.
+
+Files that only grow (like `transactions.yaml`) can be loaded with
+`FileCache.load_appended`. If the cached part of the file is unchanged, only
+the appended tail is parsed and merged into the cached data.
+
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import wimm
+from wimm.profiling import stage
+from wimm.utils import file_md5
+
+CACHE_VERSION = 6  # increase when pickled classes change
+CHUNK_SIZE = 1 << 20
+
+
+def fingerprint(path, with_hash=True):
+    """ size, modification time and (optionally) md5 of a file """
+
+    st = os.stat(path)
+    fp = {'size': st.st_size, 'mtime': st.st_mtime_ns}
+    if with_hash:
+        fp['md5'] = file_md5(path)
+    return fp
+
+
+class FileCache:
+    """ pickle cache for objects parsed from files """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+
+    def entry_path(self, src):
+        return self.cache_dir / (Path(src).name + '.pickle')
+
+    def _read(self, src):
+        """ read cache entry, return None if missing or unreadable """
+        p = self.entry_path(src)
+        if not p.exists():
+            return None
+        try:
+            with stage('unpickle'), p.open('rb') as fid:
+                entry = pickle.load(fid)
+        except Exception:  # corrupt or incompatible entry
+            return None
+
+        if entry.get('version') != (CACHE_VERSION, wimm.__version__):
+            return None
+        return entry
+
+    def _write(self, src, entry):
+        self.cache_dir.mkdir(exist_ok=True)
+        p = self.entry_path(src)
+        tmp = p.with_suffix('.tmp')
+        entry['version'] = (CACHE_VERSION, wimm.__version__)
+        with tmp.open('wb') as fid:
+            pickle.dump(entry, fid, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, p)
+
+    def get(self, src):
+        """ return cached object for `src` or None if out of date """
+
+        entry = self._read(src)
+        return None if entry is None else self._check(src, entry)
+
+    def _check(self, src, entry):
+        """ return data of `entry` or None if out of date """
+
+        fp = fingerprint(src, with_hash=False)
+        cached = entry['fingerprint']
+        if fp['size'] != cached['size']:
+            return None
+
+        if fp['mtime'] != cached['mtime']:
+            # touched, but maybe not changed
+            if file_md5(src) != cached['md5']:
+                return None
+            cached['mtime'] = fp['mtime']
+            self._write(src, entry)
+
+        return entry['data']
+
+    def put(self, src, data, fp=None):
+        """ store `data` parsed from `src`. Provide `fp` taken before parsing
+        to avoid caching a file that changed meanwhile """
+
+        if fp is None:
+            fp = fingerprint(src)
+        self._write(src, {'fingerprint': fp, 'data': data})
+
+    def load(self, src, loader):
+        """ return cached data or parse the file with `loader` and cache it """
+
+        data = self.get(src)
+        if data is None:
+            data = self._parse(src, loader)
+        return data
+
+    def _parse(self, src, loader):
+        fp = fingerprint(src)
+        data = loader(src)
+        self.put(src, data, fp)
+        return data
+
+    def _read_tail(self, src, cached):
+        """ return bytes appended after the cached part of `src` and md5 of
+        the complete file. Returns (None, None) if the cached part changed """
+
+        size = cached['size']
+        hasher = hashlib.md5()
+        last = b''
+        with open(src, 'rb') as fid:
+            remaining = size
+            while remaining > 0:
+                chunk = fid.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+                last = chunk[-1:]
+
+            # tail must start on a new line
+            if hasher.hexdigest() != cached['md5'] or last not in (b'\n', b''):
+                return None, None
+
+            tail = fid.read()
+
+        hasher.update(tail)
+        return tail, hasher.hexdigest()
+
+    def load_appended(self, src, loader, update):
+        """ load a file that is only appended to.
+
+        `update(data, tail)` merges the appended text into cached data and
+        should raise ValueError if that is not possible, in which case the
+        complete file is parsed again with `loader`.
+        """
+
+        entry = self._read(src)
+        if entry is not None:
+            data = self._check(src, entry)
+            if data is not None:
+                return data
+
+            fp = fingerprint(src, with_hash=False)
+            cached = entry['fingerprint']
+
+            if fp['size'] > cached['size']:
+                tail, md5 = self._read_tail(src, cached)
+                if tail is not None:
+                    try:
+                        data = update(entry['data'], tail.decode('utf-8'))
+                    except ValueError:
+                        pass
+                    else:
+                        fp['md5'] = md5
+                        self.put(src, data, fp)
+                        return data
+
+        return self._parse(src, loader)
+
+    def clear(self):
+        """ remove all cache entries """
+        if self.cache_dir.exists():
+            for p in self.cache_dir.glob('*.pickle'):
+                p.unlink()
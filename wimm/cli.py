@@ -3,44 +3,87 @@
 """
 main cli application
 
+Heavy dependencies (pandas, numpy, yaml) are imported by the commands that
+need them, so that `wimm --help` starts fast. Keep it that way, see
+`benchmarks/startup.py`.
+
 @author: jev
 """
 
 import os
+import sys
 import shutil
+from functools import lru_cache
 from pathlib import Path
 import click
 from click import echo
-import yaml
 
 import wimm  # app version is defined in __init__.py
-import wimm.utils as utils
-import wimm.core as core
 import wimm.structure as structure
 
+PATH = None  # database folder, set by `load_settings`
+USE_SERVER = True  # send reports requests to `wimm serve` if running
+
+
+def load_settings():
+    """ load settings and database path, once """
+    global PATH
+    if PATH is None:
+        wimm.settings = wimm.get_settings()
+        PATH = wimm.settings.get('path')
+        if not PATH:
+            echo("WARNING: environment variable WIMM_PATH is not set")
+
+
+@lru_cache(None)
+def storage():
+    """ storage backend, set with the `storage` setting """
+    from wimm.storage import get_storage
+    return get_storage(PATH, wimm.settings)
+
+
+def report(name, **options):
+    """ print a report, made by the server if it is running """
+    from wimm.server import request, ServerError
+
+    if USE_SERVER:
+        try:
+            if request(PATH, name, options, sys.stdout):
+                return
+        except ServerError as e:
+            raise click.ClickException(f'server: {e}')
+
+    from wimm.reports import REPORTS
+    try:
+        REPORTS[name](storage(), sys.stdout, **options)
+    except ValueError as e:  # invalid data
+        raise click.ClickException(str(e))
+
 
 def start_balance():
-    return core.load_data('balance', PATH)
+    return storage().load('balance')
 
 
 def transactions():
-    return core.load_data('transactions', PATH)
+    return storage().load('transactions')
 
 
 def invoices():
-    return core.load_data('invoices', PATH)
+    return storage().load('invoices')
 
 
-def hasher():
-    return utils.Hasher(PATH / structure.files['hashes'])
+def hasher(workers=None):
+    import wimm.utils as utils
+    return utils.Hasher(PATH / structure.files['hashes'], workers)
 
 
-def initialize():
+def initialize(workers=None):
     """
     initialization function for data
     names are comma separated items
 
     """
+    import wimm.utils as utils
 
     if click.confirm('Init files?'):
         # create files
@@ -58,11 +101,12 @@ def initialize():
 
     if click.confirm('Init hash?'):
         echo('Rebuilding hashes')
-        h = hasher()
+        h = hasher(workers)
         h.delete_hashes()
 
-        for key in ['INR', 'INS']:
-            h.add(PATH / structure.folders[key])
+        folders = {PATH / structure.folders[key] for key in ['INR', 'INS']}
+        h.add(*sorted(folders))
+        echo(f'Hashed files: {len(h.hashes)}')
 
     if click.confirm('Init settings?'):
 
@@ -78,20 +122,34 @@ def initialize():
 @click.command()
 def info():
     """ show status """
+    import wimm.yamlio as yamlio
     #echo(f'PATH: {PATH}')
     echo('Hashed files: %i' % len(hasher().hashes))
     for k, v in wimm.get_settings().items():
         if isinstance(v, dict):
             print(k)
-            print(yaml.dump(v))
+            print(yamlio.dump(v, sort_keys=True))
         else:
             print(f'{k}: {v}')
 
 
 @click.group()
 @click.version_option(version=wimm.__version__)
-def cli():
-    pass
+@click.option('--local', is_flag=True, help='do not use a running `wimm serve`')
+@click.option('--timings', is_flag=True,
+              help='print time spent in load, parse and aggregate stages to stderr, implies --local')
+@click.option('--profile', is_flag=True, help='like --timings, also trace peak memory')
+@click.option('--timings-format', type=click.Choice(['table', 'json']),
+              default='table', help='output format of --timings and --profile')
+@click.pass_context
+def cli(ctx, local, timings, profile, timings_format):
+    global USE_SERVER
+    USE_SERVER = not (local or timings or profile)
+    if timings or profile:
+        from wimm import profiling
+        profiling.start(memory=profile)
+        ctx.call_on_close(lambda: profiling.report(timings_format))
+    load_settings()
 
 
 @click.group()
@@ -115,16 +173,19 @@ def import_data():
 
 
 @click.command()
-def init():
+@click.option('--workers', '-j', default=None, type=int, help='threads used for hashing files')
+def init(workers):
     """ initialize data, use with caution """
-    initialize()
+    initialize(workers)
 
 
 @click.command('statement')
 @click.argument('bank')
 @click.argument('data_file')
-def import_statement(bank, data_file):
+@click.option('--chunksize', default=10000, help='rows converted at once')
+def import_statement(bank, data_file, chunksize):
     """import bank statement to the end of `transactions.yaml`"""
+    import wimm.utils as utils
 
     import wimm.importers.asn_bank as asn
     loaders = {'ASN': asn.Importer}
@@ -142,48 +203,78 @@ def import_statement(bank, data_file):
 
     loader = loaders[bank](data_file)
 
-    trs = loader.transactions()
-
-    with (PATH / structure.files['transactions']).open('a') as f:
-        f.write(f'\n# ---IMPORT--- at {utils.timestamp()} file: {data_file}\n')
-        f.write(trs.to_yaml())
+    count = 0
+    comment = f'---IMPORT--- at {utils.timestamp()} file: {data_file}'
+    for trs in loader.iter_transactions(chunksize=chunksize):
+        if not trs:  # would write an empty list
+            continue
+        storage().append('transactions', trs, comment if count == 0 else None)
+        count += len(trs)
+        echo(f'\rimported {count} transactions', nl=False)
+    echo('')
 
 
 @click.command('balance')
 @click.option('--depth', default=3, help='account depth level to show')
 @click.option('--nozeros', is_flag=True)
-def show_balance(depth, nozeros):
+@click.option('--account', default=None, help='show only this account and its subaccounts, like Assets.Bank.*')
+@click.option('--at', 'date', default=None, help='balance at the end of this date')
+@click.option('--from', 'start', default=None, help='show changes from this date')
+@click.option('--to', 'end', default=None, help='show changes before this date')
+@click.option('--invoices', 'with_invoices', is_flag=True, help='include invoices that are not booked in transactions')
+def show_balance(depth, nozeros, account, date, start, end, with_invoices):
     """ print current balance """
-
-    balance = core.balance(
-        transactions(), start_balance(), invoices(), depth=depth)
-
-    if nozeros:
-        balance = balance[balance != 0]
-
-    print('----------Balance-----------')
-    print(balance.to_string(float_format='%.2f'))
-    print('----------------------------')
-    print(f'SUM: {balance.sum():.2f}')
+    if start is not None or end is not None:
+        if date is not None:
+            raise click.UsageError('--at can not be combined with --from or --to')
+        if with_invoices:
+            raise click.UsageError('--invoices can not be combined with --from or --to')
+    report('balance', depth=depth, nozeros=nozeros, account=account,
+           date=date, start=start, end=end, with_invoices=with_invoices)
 
 
 @click.command('transactions')
-def show_transactions():
+@click.option('--from', 'start', default=None, help='first date to show')
+@click.option('--to', 'end', default=None, help='show dates before this one')
+def show_transactions(start, end):
     """ show transactions as yaml data """
-
-    print(transactions().to_yaml())
+    report('transactions', start=start, end=end)
 
 
 @click.command('invoices')
 def show_invoices():
     """ show invoices """
+    report('invoices')
+
+
+@click.command('unbalanced')
+def show_unbalanced():
+    """ show transactions that do not add up to zero """
+    report('unbalanced')
 
-    for inv in invoices():
-        print(inv)
 
+@click.command('open-invoices')
+@click.option('--aging', is_flag=True, help='show open amounts by days past due date')
+@click.option('--at', 'date', default=None, help='date for the aging report, default today')
+def show_open_invoices(aging, date):
+    """ show invoices that are not (fully) paid """
+    from wimm.receivables import Receivables
 
-def add_invoice(prefix, src_file=None, no_hash=False):
-    """ add a single invoice """
+    rec = Receivables(invoices(), transactions())
+    if aging:
+        print(rec.aging(date).to_string(float_format='%.2f'))
+    else:
+        print(rec.open_invoices().to_string(index=False, float_format='%.2f'))
+
+
+def add_invoice(prefix, src_file=None, hsh=None, invs=None):
+    """ add a single invoice, adding the file hash to `hsh` if provided.
+    Pass loaded invoices as `invs` when adding several invoices """
+    import wimm.core as core
+    import wimm.utils as utils
+
+    if invs is None:
+        invs = invoices()
 
     if src_file is not None:
         assert src_file.exists(), 'File not found'
@@ -192,7 +283,7 @@ def add_invoice(prefix, src_file=None, no_hash=False):
 
     inv['amount'] = click.prompt('amount', type=float)
 
-    inv['id'] = click.prompt('id', invoices().get_next_id(prefix))
+    inv['id'] = click.prompt('id', invs.get_next_id(prefix))
     inv['tax'] = click.prompt('tax', utils.tax(inv['amount']))
 
     inv['ext_name'] = click.prompt('ext_company_name')
@@ -214,25 +305,21 @@ def add_invoice(prefix, src_file=None, no_hash=False):
         shutil.copy(src_file, dest_file)
         inv['attachment'] = dest_file.relative_to(PATH).as_posix()
 
-        if not no_hash:
-            hsh = hasher()
+        if hsh is not None:
             hsh.add(dest_file)
 
-    invoices_new = core.Invoices()
-    invoices_new.append(inv)
-
-    with open(PATH / structure.files['invoices'], 'a') as f:
-        f.write(invoices_new.to_yaml())
+    storage().append('invoices', [inv])
+    storage().append('transactions', [inv.transaction()])
 
-    with (PATH / structure.files['transactions']).open('a') as f:
-        f.write(inv.transaction().to_yaml())
+    invs.append(inv)
 
 
 @click.command('invoice')
 @click.argument('prefix')
 @click.option('--pattern', '-p', default=None, help='Filename or a search pattern, like *.pdf')
 @click.option("--no_hash", is_flag=True, help="Do not check if file is already in database")
-def add_invoices(prefix, pattern, no_hash):
+@click.option('--workers', '-j', default=None, type=int, help='threads used for hashing files')
+def add_invoices(prefix, pattern, no_hash, workers):
     """ add invoice(s).
 
     \b
@@ -255,21 +342,27 @@ def add_invoices(prefix, pattern, no_hash):
         else:
             files = [Path(pattern).absolute()]
 
+    invs = invoices()
+    hsh = None if no_hash else hasher(workers)
+    file_hashes = {}
+    if hsh is not None:
+        existing = [f for f in files if f.exists()]
+        file_hashes = dict(zip(existing, hsh.hash_files(existing)))
+
     for src_file in files:
         try:
             assert src_file.exists(), 'File not found'
 
-            if not no_hash:
-                hsh = hasher()
-                assert hsh.is_present(
-                    src_file) == False, f'{src_file} is already in database.'
+            if hsh is not None:
+                assert file_hashes[src_file] not in hsh.hashes, \
+                    f'{src_file} is already in database.'
 
             devnull = open(os.devnull, 'w')
             opener = "open" if sys.platform == "darwin" else "xdg-open"
             subprocess.call([opener, src_file.as_posix()],
                             stdout=devnull, stderr=devnull)
 
-            add_invoice(prefix, src_file, no_hash)
+            add_invoice(prefix, src_file, hsh, invs)
 
         except AssertionError as e:
             echo(e)
@@ -277,23 +370,95 @@ def add_invoices(prefix, pattern, no_hash):
 
 @click.command('transactions')
 def convert_transactions():
+    import wimm.core as core
+    import wimm.yamlio as yamlio
 
     if click.confirm('Transactions file will be overwritten. Sure?'):
         fname = PATH / structure.files['transactions']
-        data_v1 = yaml.load(fname.open(), Loader=yaml.SafeLoader)
+        data_v1 = yamlio.load_file(fname)
         trs = core.Transactions(
-            [wimm.core.Transaction.from_v1(d).to_dict() for d in data_v1])
+            [core.Transaction.from_v1(d).to_dict() for d in data_v1])
         trs.to_yaml(fname)
 
 
+@click.command('split')
+@click.option('--year', type=int, default=None,
+              help='first year kept in transactions.yaml, default this year')
+def convert_split(year):
+    """ move closed years from transactions.yaml to transactions/YYYY.yaml """
+    import wimm.core as core
+
+    if click.confirm('Comments in transactions.yaml will be lost. Sure?'):
+        moved = core.split_transactions(PATH, year)
+        for key, count in moved.items():
+            echo(f'{key}: {count} transactions')
+        if not moved:
+            echo('Nothing to split')
+
+
+@click.command('close-period')
+@click.argument('date')
+def close_period(date):
+    """ make the balance at the end of DATE the start balance and move
+    transactions until DATE to the archive """
+    from wimm.closing import close_period as close
+
+    if wimm.settings.get('storage', 'yaml') != 'yaml':
+        raise click.ClickException('closing works on yaml storage, '
+                                   'use `convert to-yaml` first')
+    if click.confirm(f'Close transactions until {date}? '
+                     'Comments in changed files will be lost'):
+        try:
+            archive, count = close(PATH, date)
+        except (FileExistsError, ValueError, RuntimeError) as e:
+            raise click.ClickException(str(e))
+        echo(f'Moved {count} transactions to {archive}, balance verified')
+
+
+@click.command()
+def serve():
+    """ keep the database in memory and answer `show` commands.
+    Other wimm commands use the server while it runs """
+    from wimm.server import serve as run_server
+    run_server(PATH, storage())
+
+
+@click.command('to-sqlite')
+def convert_to_sqlite():
+    """ copy the yaml files to the sqlite database """
+    from wimm.storage import SqliteStorage
+
+    db = SqliteStorage(PATH)
+    if click.confirm(f'Data in {db.db_file} will be replaced. Sure?'):
+        db.import_yaml()
+        echo(f'Saved to {db.db_file}')
+    db.close()
+
+
+@click.command('to-yaml')
+def convert_to_yaml():
+    """ write the sqlite database to the yaml files """
+    from wimm.storage import SqliteStorage
+
+    db = SqliteStorage(PATH)
+    if click.confirm('Yaml files will be overwritten. Sure?'):
+        db.export_yaml()
+    db.close()
+
+
 # build groups
 import_data.add_command(import_statement)
 
 show.add_command(show_balance)
 show.add_command(show_transactions)
 show.add_command(show_invoices)
+show.add_command(show_open_invoices)
+show.add_command(show_unbalanced)
 
 convert.add_command(convert_transactions)
+convert.add_command(convert_to_sqlite)
+convert.add_command(convert_to_yaml)
+convert.add_command(convert_split)
 
 add.add_command(add_invoices)
 
@@ -303,13 +468,12 @@ cli.add_command(import_data)
 cli.add_command(show)
 cli.add_command(info)
 cli.add_command(add)
+cli.add_command(close_period)
 cli.add_command(convert)
+cli.add_command(serve)
 
 
 if __name__ == "__main__":  # note - name will be wimm.cli in case of terminal cmd
 
     PATH = list(Path(__file__).parents)[1] / 'tests/data'
-else:
-    PATH = wimm.get_settings()['path']
-    if not PATH:
-        echo("WARNING: environment variable WIMM_PATH is not set")
+    wimm.settings = structure.settings
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Closing a period
+=================
+
+`close_period` folds the transactions up to a date into the start balance
+(`balance.yaml`), so that daily commands only read the open period.
+
+* the end balance of the closed transactions becomes the new start balance
+* closed transactions and the old start balance go to the `archive` folder
+* transaction files (including yearly files, see `core.split_transactions`)
+  keep only the open transactions
+
+Afterwards the balance is calculated again from the files and compared with
+the balance before closing. The archive allows to undo a closing by hand.
+
+"""
+import copy
+import os
+
+import wimm.core as core
+import wimm.structure as structure
+import wimm.utils as utils
+import wimm.yamlio as yamlio
+
+
+def archive_files(db_path, date):
+    """ archived transactions and start balance of a closing at `date` """
+    archive = db_path / structure.folders['archive']
+    return (archive / f'transactions_{date}.yaml',
+            archive / f'balance_{date}.yaml')
+
+
+def _is_closed(d, date):
+    return d.get('date') is not None and str(d['date']) <= date
+
+
+def _replace(path, data):
+    """ write yaml data to a temporary file first """
+    tmp = path.with_suffix('.tmp')
+    with tmp.open('w') as f:
+        if data:  # an empty file can be appended to
+            yamlio.dump(data, f)
+    os.replace(tmp, path)
+
+
+def full_balance(db_path):
+    """ start balance plus all transactions, from the files """
+    start = core.load_start_balance(db_path / structure.files['balance'])
+    return core.balance(core.load_data('transactions', db_path), start)
+
+
+def close_period(db_path, date):
+    """ close transactions dated until the end of `date`.
+    Returns the archive file of the closed transactions and their number """
+
+    date = core._date_key(date)
+    balance_file = db_path / structure.files['balance']
+    trs_archive, balance_archive = archive_files(db_path, date)
+    if trs_archive.exists() or balance_archive.exists():
+        raise FileExistsError(f'{date} is already closed, see {trs_archive}')
+
+    before = full_balance(db_path)
+
+    closed, rewrites = [], {}
+    for src in core.transaction_files(db_path):
+        items = list(yamlio.iter_file(src))
+        keep = [d for d in items if not _is_closed(d, date)]
+        if len(keep) < len(items):
+            closed += [d for d in items if _is_closed(d, date)]
+            rewrites[src] = keep
+
+    if not closed:
+        raise ValueError(f'no transactions until {date}')
+
+    start = core.load_start_balance(balance_file)
+    trs = core.Transactions(copy.deepcopy(closed))  # files keep missing values
+    closing = utils.from_cents(utils.to_cents(start).add(
+        trs.ledger.balance_cents(), fill_value=0))  # exact, in cents
+
+    trs_archive.parent.mkdir(exist_ok=True)
+    yamlio.dump_file(trs_archive, closed)
+    os.replace(balance_file, balance_archive)
+    yamlio.dump_file(balance_file, {k: float(v) for k, v in closing.items()})
+
+    main = db_path / structure.files['transactions']
+    for src, keep in rewrites.items():
+        if keep or src == main:
+            _replace(src, keep)
+        else:  # a yearly file that is closed completely
+            src.unlink()
+
+    after = full_balance(db_path)
+    diff = utils.to_cents(before).sub(utils.to_cents(after), fill_value=0)
+    changed = list(diff.index[diff != 0])
+    if changed or set(before.index) != set(after.index):
+        raise RuntimeError(f'balance changed for {changed or "accounts"}, '
+                           f'original data is in {trs_archive.parent}')
+
+    return trs_archive, len(closed)
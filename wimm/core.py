@@ -33,12 +33,21 @@ A tranaction may be taxed (with a VAT for example)
 
 
 """
-from collections import UserList, UserDict
+import bisect
+import math
+import os
+from collections import UserList
+from collections.abc import MutableMapping
+from functools import reduce, wraps
 from typing import Tuple
 import yaml
 import wimm.utils as utils
+import wimm.yamlio as yamlio
+from wimm.profiling import stage
 import pandas as pd
 import wimm
+from wimm.ledger import Ledger, to_days
+import numpy as np
 from dataclasses import dataclass, asdict
 
 
@@ -48,20 +57,168 @@ def parse_account(s):
     return s.strip().split('.')
 
 
-def load_data(name, db_path):
-    """ load data from yaml """
+def load_data(name, db_path, use_cache=True):
+    """ load data from yaml.
+    Parsed data is cached in the `.wimm` folder if it exists """
+    with stage(f'load {name}') as st:
+        data = _load_data(name, db_path, use_cache)
+        st.count = len(data)
+    return data
+
+
+def _load_data(name, db_path, use_cache):
     import wimm.structure as structure
+    from wimm.cache import FileCache
     fcns = {'balance': load_start_balance,
-            'transactions': Transactions.from_yaml,
             'invoices': Invoices.from_yaml}
 
     p = db_path / structure.files[name]
     assert p.exists(), f"File {p} not found"
-    return fcns[name](p)
+
+    wimm_dir = db_path / structure.folders['WIMM']
+    cache = None
+    if use_cache and wimm_dir.is_dir():
+        cache = FileCache(wimm_dir / 'cache')
+
+    if name == 'transactions':
+        return _load_transaction_files(transaction_files(db_path), cache)
+
+    if cache is None:
+        return fcns[name](p)
+    return cache.load(p, fcns[name])
+
+
+def _load_transactions(yaml_file):
+    """ load transactions with precalculated account totals """
+    trs = Transactions.from_yaml(yaml_file)
+    trs.ledger.totals()
+    return trs
+
+
+def _append_transactions(transactions, text):
+    """ add transactions from yaml text appended to a file """
+
+    try:
+        with stage('parse appended'):
+            data = yamlio.load(text)
+    except yaml.YAMLError as e:
+        raise ValueError('could not parse appended data') from e
+
+    if data is None:  # only comments or whitespace
+        return transactions
+    if not isinstance(data, list):
+        raise ValueError('appended data is not a list')
+
+    with stage('build appended') as st:
+        transactions.extend(data)
+        st.count = len(data)
+    return transactions
+
+
+def transaction_files(db_path, date_range=None):
+    """ transaction files of a database: yearly files of closed years in the
+    `transactions` folder, followed by `transactions.yaml`.
+    Yearly files (`YYYY.yaml`) outside of `date_range` are left out """
+    import wimm.structure as structure
+
+    files = sorted((db_path / structure.folders['transactions']).glob('*.yaml'))
+    if date_range is not None:
+        files = [p for p in files if _year_in_range(p.stem, date_range)]
+    return files + [db_path / structure.files['transactions']]
+
+
+def _year_in_range(name, date_range):
+    """ check if the year `name` overlaps `date_range`. True for other names """
+    if not (len(name) == 4 and name.isdigit()):
+        return True
+    start, end = date_range
+    if start is not None and name < _date_key(start)[:4]:
+        return False
+    if end is not None and f'{name}-01-01' >= _date_key(end):
+        return False
+    return True
+
+
+def _load_transaction_files(files, cache=None, workers=None):
+    """ load and join transaction files. The last one is the current file,
+    which is only appended to. Other files that are not cached are parsed
+    in a pool of `workers` processes (default: number of cpus) """
+    from wimm.cache import fingerprint
+
+    *closed, current = files
+    workers = workers or os.cpu_count() or 1
+    parts = [None if cache is None else cache.get(p) for p in closed]
+    todo = [i for i, part in enumerate(parts) if part is None]
+    fps = {i: fingerprint(closed[i]) for i in todo} if cache is not None else {}
+
+    def load_current():
+        if cache is None:
+            return _load_transactions(current)
+        return cache.load_appended(current, _load_transactions,
+                                   _append_transactions)
+
+    with stage('parse files') as st:
+        st.count = len(todo)
+        if len(todo) > 1 and workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {i: pool.submit(_load_transactions, closed[i])
+                           for i in todo}
+                last = load_current()
+                for i, future in futures.items():
+                    parts[i] = future.result()
+        else:
+            for i in todo:
+                parts[i] = _load_transactions(closed[i])
+            last = load_current()
+
+    for i in fps:
+        cache.put(closed[i], parts[i], fps[i])
+
+    return Transactions.concat(parts + [last])
+
+
+def split_transactions(db_path, year=None):
+    """ move transactions dated before `year` (default: this year) from
+    `transactions.yaml` to yearly files in the `transactions` folder.
+    Comments in `transactions.yaml` are lost.
+    Returns the number of moved transactions per year """
+    import datetime as dt
+    import wimm.structure as structure
+
+    year = str(year or dt.date.today().year)
+    src = db_path / structure.files['transactions']
+
+    closed, current = {}, []
+    for d in yamlio.iter_file(src):
+        date = d.get('date')
+        key = None if date is None else str(date)[:4]
+        if key is not None and key < year:
+            closed.setdefault(key, []).append(d)
+        else:
+            current.append(d)
+
+    if not closed:
+        return {}
+
+    folder = db_path / structure.folders['transactions']
+    folder.mkdir(exist_ok=True)
+    for key, items in closed.items():
+        yamlio.dump_file(folder / f'{key}.yaml', items, mode='a')
+
+    tmp = src.with_suffix('.tmp')
+    if current:
+        yamlio.dump_file(tmp, current)
+    else:  # an empty file can be appended to, `[]` can not
+        tmp.write_text('')
+    os.replace(tmp, src)
+    return {key: len(closed[key]) for key in sorted(closed)}
 
 
 def load_start_balance(yaml_file):
-    d = yaml.load(open(yaml_file), Loader=yaml.SafeLoader)
+    with stage('parse') as st:
+        d = yamlio.load_file(yaml_file)
+        st.count = len(d) if d else 0
     return pd.Series(d)
 
 
@@ -75,24 +232,68 @@ def get_account(item):
     return account
 
 
-def balance(transactions, start_balance=None, invoices=None, depth=None):
-    """ calculate balance """
+def balance(transactions, start_balance=None, invoices=None, depth=None,
+            date=None):
+    """ calculate balance, optionally at the end of `date`.
+    Provide `invoices` to include invoice postings that are not in
+    `transactions` """
 
-    accounts = transactions.process()
+    ledger = transactions.ledger
+    with stage('aggregate') as st:  # in cents, converted once at the end
+        cents = ledger.balance_cents(date)
 
-    if start_balance is not None:
-        accounts = accounts.add(start_balance, fill_value=0)
+        if start_balance is not None:
+            cents = cents.add(utils.to_cents(start_balance), fill_value=0)
 
-    # if invoices is not None:
-    #     inv_acc  = invoices.to_accounts() # convert to series
-    #     accounts = accounts.add(inv_acc, fill_value=0)
+        if invoices is not None:
+            cents = cents.add(invoices.to_ledger().balance_cents(date),
+                              fill_value=0)
 
-    names = accounts.index.to_list()
+        accounts = utils.from_cents(cents)
+        st.count = len(accounts)
 
     if depth is None:
         return accounts
     else:
-        return accounts.groupby(utils.names_to_labels(names, depth)).sum()
+        return account_tree(accounts).balance(depth)
+
+
+def account_tree(accounts):
+    """ create an `AccountTree` from account balances """
+    from wimm.accounts import AccountTree
+    with stage('account tree') as st:
+        tree = AccountTree(accounts)
+        st.count = len(tree.totals)
+    return tree
+
+
+def stream_balance(yaml_file, date_range=None, chunk_size=10000):
+    """ balance of a transactions file, calculated in bounded memory.
+    Optionally select `date_range[0] <= date < date_range[1]`, where
+    a bound may be None """
+
+    accounts = pd.Series(dtype=float, name='amount')
+    for trs in Transactions.iter_chunks(yaml_file, chunk_size, date_range):
+        accounts = accounts.add(trs.process(), fill_value=0)
+    accounts.index.name = 'account'
+    return accounts
+
+
+def _date_key(date):
+    """ ISO date string, for comparing dates given as strings or objects """
+    return pd.Timestamp(date).strftime(wimm.DATE_FMT)
+
+
+def _modifies(method):
+    """ wrap a list method so that derived data is dropped after a change """
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        res = method(self, *args, **kwargs)
+        self._changed()
+        return res
+
+    return wrapper
 
 
 class ListPlus(UserList):
@@ -105,46 +306,164 @@ class ListPlus(UserList):
         if self.cls_factory is not None:
             self.data = [self.cls_factory(**d) for d in self.data]
 
-    def to_yaml(self, yaml_file=None, confirm=False):
-        """ write to file or return string """
+    def _changed(self):
+        """ called after the list is modified. Override to clear cached data """
+
+    __setitem__ = _modifies(UserList.__setitem__)
+    __delitem__ = _modifies(UserList.__delitem__)
+    __iadd__ = _modifies(UserList.__iadd__)
+    __imul__ = _modifies(UserList.__imul__)
+    append = _modifies(UserList.append)
+    insert = _modifies(UserList.insert)
+    pop = _modifies(UserList.pop)
+    remove = _modifies(UserList.remove)
+    clear = _modifies(UserList.clear)
+    reverse = _modifies(UserList.reverse)
+    sort = _modifies(UserList.sort)
+    extend = _modifies(UserList.extend)
 
-        data = [utils.to_dict(obj) for obj in self.data]
+    def to_yaml(self, yaml_file=None, confirm=False, stream=None):
+        """ write to file or open `stream`, otherwise return string """
+
+        data = (utils.to_dict(obj) for obj in self.data)
 
         if yaml_file:
             utils.save_yaml(yaml_file, data, ask_confirmation=confirm)
-
-        return yaml.dump(data, sort_keys=False)
+        elif stream is not None:
+            yamlio.dump(data, stream)
+        else:
+            return yamlio.dump(data)
 
     @classmethod
     def from_yaml(cls, yaml_file):
         """ create class from a yaml file """
 
-        data = yaml.load(open(yaml_file), Loader=yaml.SafeLoader)
+        with stage('parse') as st:
+            data = yamlio.load_file(yaml_file)
+            st.count = len(data) if data else 0
 
+        with stage('build') as st:
+            obj = cls(data)
+            st.count = len(obj)
         # if cls.cls_factory is None:
-        return cls(data)
+        return obj
         # else:
         #    return cls( [cls.cls_factory.from_dict(d) for d in data])
 
 
-class Transaction(UserDict):
-    date: str
-    description: str
-    transfers: dict
+class Record(MutableMapping):
+    """ compact dict-like record.
+
+    Keys listed in `__slots__` of a subclass are stored in slots and are
+    always present, other keys go to an `_extra` dict. Keys are ordered as
+    in `__slots__`, followed by the extra keys.
+    """
+    __slots__ = ('_extra',)
+    _defaults = ()  # default per slot, a callable is called for each record
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = cls.__dict__.get('__slots__', ())
+        cls._fieldset = frozenset(cls._fields)
 
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        self._extra = None
+        if args:
+            kwargs = {**dict(*args), **kwargs}
+
+        fields = self._fieldset
+        for key, value in kwargs.items():
+            if key in fields:
+                setattr(self, key, value)
+            else:
+                self[key] = value
+
+        for key, default in zip(self._fields, self._defaults):
+            if key not in kwargs:
+                setattr(self, key, default() if callable(default) else default)
+
+    def __getitem__(self, key):
+        if key in self._fieldset:
+            try:
+                return getattr(self, key)
+            except AttributeError:  # deleted
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._fieldset:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._fieldset:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for key in self._fields:
+            if hasattr(self, key):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __getattr__(self, name):
+        # only called for extra keys (or unset slots)
+        if name != '_extra' and self._extra and name in self._extra:
+            return self._extra[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __getstate__(self):
+        # explicit state, unpickling does not fall back to `__getattr__`
+        values = tuple(getattr(self, k, self) for k in self._fields)
+        if any(v is self for v in values):  # a slot was deleted
+            values = {k: v for k, v in zip(self._fields, values) if v is not self}
+        return self._extra, values
+
+    def __setstate__(self, state):
+        self._extra, values = state
+        items = values.items() if isinstance(values, dict) else zip(self._fields, values)
+        for key, value in items:
+            setattr(self, key, value)
+
+    def copy(self):
+        new = self.__class__.__new__(self.__class__)
+        new._extra = None
+        for key, value in self.items():
+            new[key] = value
+        return new
 
-        defaults = [('date', None),
-                    ('description', ''),
-                    ('transfers', {})]
+    def to_dict(self):
+        return dict(self)
 
-        for k, v in defaults:
-            self.setdefault(k, v)
 
+class Transaction(Record):
+    __slots__ = ('date', 'description', 'transfers')
+    _defaults = (None, '', dict)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
         self._check_totals()
 
     def _check_totals(self):
+        """ fill in a missing amount, summing in cents """
 
         total = 0
         missing = None
@@ -155,16 +474,14 @@ class Transaction(UserDict):
                 else:
                     raise ValueError('More than one entry is missing')
             else:
-                total += v
+                total += utils.to_cents(v)
 
         if missing:
-            self.transfers[missing] = -total
+            self.transfers[missing] = utils.from_cents(-total)
 
-    def __getattr__(self, name):
-        if name in self.data:
-            return self.data[name]
-        else:
-            raise AttributeError(name)
+    def is_balanced(self):
+        """ True if the transfers add up to zero, to the cent """
+        return sum(utils.to_cents(v) for v in self.transfers.values()) == 0
 
     def to_records(self):
         """ convert to simple account operations """
@@ -179,10 +496,10 @@ class Transaction(UserDict):
         if compact:
             return {k: v for k, v in self.items() if v is not None}
         else:
-            return self
+            return dict(self)
 
-    def to_yaml(self, compact=True):
-        return yaml.dump([self.to_dict(compact)], sort_keys=False)
+    def to_yaml(self, compact=True, stream=None):
+        return yamlio.dump([self.to_dict(compact)], stream)
 
     @classmethod
     def from_v1(cls, tr):
@@ -200,8 +517,83 @@ class Transactions(ListPlus):
     """ transactons class, extension of a list """
 
     def __init__(self, *args, **kwargs):
+        self._ledger = None
         super().__init__(*args, cls_factory=Transaction, **kwargs)
 
+    def _changed(self):
+        self._ledger = None
+
+    @classmethod
+    def concat(cls, parts):
+        """ join lists of transactions, joining their ledgers instead of
+        building a new one """
+
+        if len(parts) == 1:
+            return parts[0]
+        new = cls()
+        new.data = [tr for part in parts for tr in part.data]
+        new._ledger = reduce(Ledger.concat, (part.ledger for part in parts))
+        return new
+
+    def extend(self, other):
+        """ add transactions, updating the ledger instead of rebuilding it """
+
+        ledger = self._ledger
+        new = Transactions(other)
+        super().extend(new)
+        if ledger is not None:
+            self._ledger = ledger.concat(new.ledger)
+
+    @property
+    def ledger(self) -> Ledger:
+        """ columnar representation, built once and cached until modified """
+        if self._ledger is None:
+            with stage('ledger') as st:
+                self._ledger = Ledger.from_transactions(self.data)
+                st.count = len(self._ledger)
+        return self._ledger
+
+    @staticmethod
+    def in_range(items, date_range=None):
+        """ yield transactions (or dicts) with
+        `date_range[0] <= date < date_range[1]`, where a bound may be None """
+        if date_range is None:
+            yield from items
+            return
+
+        start, end = date_range
+        start = '' if start is None else _date_key(start)
+        end = '~' if end is None else _date_key(end)  # sorts after digits
+        for d in items:
+            date = d.get('date')
+            if date is not None and start <= str(date) < end:
+                yield d
+
+    @classmethod
+    def _iter_dicts(cls, yaml_file, date_range=None):
+        return cls.in_range(yamlio.iter_file(yaml_file), date_range)
+
+    @classmethod
+    def iter_yaml(cls, yaml_file, date_range: Tuple = None):
+        """ read transactions one by one from a yaml file.
+        Optionally select `date_range[0] <= date < date_range[1]` """
+
+        for d in cls._iter_dicts(yaml_file, date_range):
+            yield Transaction(**d)
+
+    @classmethod
+    def iter_chunks(cls, yaml_file, chunk_size=10000, date_range=None):
+        """ read a yaml file as chunks of `chunk_size` transactions """
+
+        chunk = []
+        for d in cls._iter_dicts(yaml_file, date_range):
+            chunk.append(d)
+            if len(chunk) == chunk_size:
+                yield cls(chunk)
+                chunk = []
+        if chunk:
+            yield cls(chunk)
+
     def to_records(self):
         for tr in self.data:
             for rec in tr.to_records():
@@ -209,39 +601,28 @@ class Transactions(ListPlus):
 
     def process(self):
         """ return accounts and their balances """
-        return self.to_df().groupby(['account']).sum()['amount']
-
-    def to_df(self, date_range: Tuple = None) -> pd.DataFrame:
-        """ transactions as DataFrame """
-
-        df = pd.DataFrame.from_records(self.to_records())
-        df['date'] = pd.to_datetime(df['date'])
-
-        if date_range is None:
-            return df
-
-        # select dates
-        mask = (df.date >= date_range[0]) & (df.date < date_range[1])
-        return df[mask]
+        return self.ledger.balance()
 
+    def unbalanced(self):
+        """ transactions whose transfers do not add up to zero """
+        return [tr for tr in self.data if not tr.is_balanced()]
 
-class Invoice(UserDict):
+    def to_df(self, date_range: Tuple = None) -> pd.DataFrame:
+        """ transactions as DataFrame, optionally selecting
+        `date_range[0] <= date < date_range[1]` """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+        ledger = self.ledger
+        with stage('to_df') as st:
+            df = ledger.to_df(date_range)
+            st.count = len(df)
+        return df
 
-        keys = ['id', 'amount', 'tax', 'date', 'from', 'to',
-                'description', 'attachment', 'due_date', 'ext_name']
-        vals = ['INV00_000', 0.0, None,  None, 'Uncategorized',
-                'Uncategorized', None, None, None, 'ext_company_name']
-        for k, v in zip(keys, vals):
-            self.setdefault(k, v)
 
-    def __getattr__(self, name):
-        if name in self.data:
-            return self.data[name]
-        else:
-            raise AttributeError(name)
+class Invoice(Record):
+    __slots__ = ('id', 'amount', 'tax', 'date', 'from', 'to',
+                 'description', 'attachment', 'due_date', 'ext_name')
+    _defaults = ('INV00_000', 0.0, None,  None, 'Uncategorized',
+                 'Uncategorized', None, None, None, 'ext_company_name')
 
     @property
     def prefix(self):
@@ -249,8 +630,8 @@ class Invoice(UserDict):
 
     def validate(self):
 
-        utils.validate(self.data['id'], "IN([A-Z]{1}[0-9]{2}_[0-9]{3})")
-        utils.validate(self.data['date'], "([0-9]{4}-[0-9]{2}-[0-9]{2})")
+        utils.validate(self['id'], "IN([A-Z]{1}[0-9]{2}_[0-9]{3})")
+        utils.validate(self['date'], "([0-9]{4}-[0-9]{2}-[0-9]{2})")
 
     def set_accounts(self, accounts=None):
 
@@ -259,19 +640,12 @@ class Invoice(UserDict):
             accounts = utils.invoice_accounts(
                 self.prefix, params, 'invoice_accounts')
 
-        self.data['from'] = accounts['from']
-        self.data['to'] = accounts['to']
+        self['from'] = accounts['from']
+        self['to'] = accounts['to']
 
     def transaction(self):
         """ single transaction for an invoice """
-
-        # TODO: refactor. Ok, it's late and I don't have time to rewrite all the old code.
-        # so  I'll just gently wrap it in a new function.
-        trs = [Transaction.from_v1(tr) for tr in self._transactions()]
-        tr = trs[0]
-        if len(trs) == 2:
-            tr.transfers = {**tr.transfers, **trs[1].transfers}
-        return tr
+        return Invoices([self]).to_transactions()[0]
 
     def _transactions(self):
         """ return ivoice transactions as a list, `old style` transactions """
@@ -300,47 +674,96 @@ class Invoice(UserDict):
         return trs
 
     def to_yaml(self):
-        return yaml.dump(self.data, sort_keys=False)
+        return yamlio.dump(dict(self))
 
-    def rest_amount(self):
-        return self.amount - self.amount_payed
+    def rest_amount(self, amount_paid=0.0):
+        """ amount still to be paid, see `receivables.Receivables` """
+        return self.amount - math.copysign(amount_paid, self.amount)
 
     def __repr__(self):
         return f"{self.id} amount:{self.amount:<10}  {self['from']} -->  {self.to}"
 
 
+class InvoiceIndex:
+    """ lookup of invoices by id.
+    Ids are kept sorted, so a prefix is a range found by bisection """
+
+    def __init__(self, invoices=()):
+        self.by_id = {}
+        self.ids = []  # sorted ids
+        self.items = []  # invoices in order of `ids`
+
+        for inv in invoices:
+            self.by_id.setdefault(inv['id'], inv)
+        pairs = sorted(((inv['id'], i) for i, inv in enumerate(invoices)))
+        self.ids = [invoice_id for invoice_id, _ in pairs]
+        self.items = [invoices[i] for _, i in pairs]
+
+    def add(self, inv):
+        self.by_id.setdefault(inv['id'], inv)
+        pos = bisect.bisect_right(self.ids, inv['id'])
+        self.ids.insert(pos, inv['id'])
+        self.items.insert(pos, inv)
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.ids, prefix)
+        hi = bisect.bisect_left(self.ids, prefix + '\U0010ffff', lo)
+        return lo, hi
+
+    def with_prefix(self, prefix):
+        """ invoices with ids starting with `prefix`, sorted by id """
+        lo, hi = self._range(prefix)
+        return self.items[lo:hi]
+
+    def last_id(self, prefix):
+        """ highest id starting with `prefix` or None """
+        lo, hi = self._range(prefix)
+        return self.ids[hi - 1] if hi > lo else None
+
+
 class Invoices(ListPlus):
 
     def __init__(self, *args, **kwargs):
+        self._index = None
         super().__init__(*args, cls_factory=Invoice, **kwargs)
 
+    def _changed(self):
+        self._index = None
+
+    def append(self, item):
+        """ add an invoice, updating the index instead of rebuilding it """
+        index = self._index
+        super().append(item)
+        if index is not None:
+            index.add(self.data[-1])
+            self._index = index
+
+    @property
+    def index(self) -> InvoiceIndex:
+        """ id index, built once and updated on append.
+        Changing an id of a listed invoice is not tracked """
+        if self._index is None:
+            self._index = InvoiceIndex(self.data)
+        return self._index
+
     def get_by_id(self, invoice_id):
         """ get a invoice(s) by id
         id may be a partial string, with a wildcard *. Example INS*
         """
 
         if invoice_id[-1] == '*':  # multiple matching
-            pat = invoice_id[:-1]
-            n = len(pat)
-            matches = []
-            for inv in self.data:
-                if inv['id'][:n] == pat:
-                    matches.append(inv)
-            return Invoices(matches).get_sorted_by('id')
+            return self.index.with_prefix(invoice_id[:-1])
 
-        else:
-            for inv in self.data:  # single matching
-                if inv['id'] == invoice_id:
-                    return inv
-
-        raise KeyError('id not found')
+        try:
+            return self.index.by_id[invoice_id]
+        except KeyError:
+            raise KeyError('id not found') from None
 
     def get_next_id(self, prefix):
         """ get next available invoice number for a prefix """
 
-        try:
-            invoice_id = self.get_by_id(prefix+'*')[-1]['id']
-        except IndexError:  # prefix not found, make new one
+        invoice_id = self.index.last_id(prefix)
+        if invoice_id is None:  # prefix not found, make new one
             return f"{prefix}{utils.timestamp('%y')}_001"
 
         nr = int(invoice_id[-3:]) + 1
@@ -354,22 +777,78 @@ class Invoices(ListPlus):
 
     def to_df(self):
         """ convert to DataFrame """
-        return pd.DataFrame.from_records(self.data)
+        return pd.DataFrame.from_records([dict(inv) for inv in self.data])
+
+    def _postings(self):
+        """ invoice fields and tax accounts, as python lists """
+
+        data = self.data
+        cols = {k: [inv[k] for inv in data]
+                for k in ['id', 'date', 'amount', 'tax', 'from', 'to']}
+        cols['tax'] = [tax or 0 for tax in cols['tax']]
+
+        # tax accounts, formatted for all taxed invoices at once
+        taxed = [i for i, tax in enumerate(cols['tax']) if tax]
+        params = pd.DataFrame({'invoice_id': [cols['id'][i] for i in taxed],
+                               'ext_name': [data[i]['ext_name'] for i in taxed]},
+                              index=taxed, dtype=object)
+        accounts = utils.invoice_accounts_bulk(
+            params['invoice_id'].str[:3], params, 'tax_accounts')
+
+        cols['tax_from'] = [None] * len(data)
+        cols['tax_to'] = [None] * len(data)
+        for i, acc_from, acc_to in zip(taxed, accounts['from'].tolist(),
+                                       accounts['to'].tolist()):
+            cols['tax_from'][i] = acc_from
+            cols['tax_to'][i] = acc_to
+
+        return cols
 
     def to_transactions(self):
-        """ convert to transactions """
+        """ convert to transactions, one per invoice including tax """
 
-        trs = Transactions()
-        for inv in self.data:
-            trs += inv.transactions()
+        cols = self._postings()
+        data = []
+        for inv_id, date, amount, acc_from, acc_to, tax, tax_from, tax_to in zip(
+                cols['id'], cols['date'], cols['amount'], cols['from'],
+                cols['to'], cols['tax'], cols['tax_from'], cols['tax_to']):
 
-        return trs
+            transfers = {acc_from: -amount}
+            transfers[acc_to] = transfers.get(acc_to, 0) + amount
+            if tax:  # accounts may coincide, keep the transaction balanced
+                transfers[tax_from] = transfers.get(tax_from, 0) - tax
+                transfers[tax_to] = transfers.get(tax_to, 0) + tax
+            data.append({'date': date, 'description': 'Invoice ' + inv_id,
+                         'transfers': transfers})
+
+        return Transactions(data)
+
+    def to_ledger(self) -> Ledger:
+        """ invoice and tax postings as a ledger, built without
+        creating transactions """
+
+        cols = self._postings()
+        taxed = [i for i, tax in enumerate(cols['tax']) if tax]
+
+        def pick(key):
+            return [cols[key][i] for i in taxed]
+
+        amounts = utils.to_cents(cols['amount'])
+        taxes = utils.to_cents(pick('tax'))
+
+        codes, accounts = pd.factorize(pd.Series(
+            cols['from'] + cols['to'] + pick('tax_from') + pick('tax_to'),
+            dtype=object))
+        dates = to_days(cols['date'] + cols['date'] + pick('date') * 2)
+
+        return Ledger(accounts.tolist(), codes, dates,
+                      np.concatenate((-amounts, amounts, -taxes, taxes)))
 
     def to_accounts(self):
         """ convert to accounts, including taxes """
         df = self.to_df()
         acc = df.set_index('id')['amount']  # account series
-        tax = pd.Series([df.tax[df.tax > 0].sum(),
-                         df.tax[df.tax < 0].sum()],
-                        index=['tax.to_receive', 'tax.to_pay'])
+        tax = utils.from_cents(pd.Series([utils.to_cents(df.tax[df.tax > 0]).sum(),
+                                          utils.to_cents(df.tax[df.tax < 0]).sum()],
+                                         index=['tax.to_receive', 'tax.to_pay']))
         return pd.concat((acc, tax))
@@ -16,3 +16,8 @@ class Importer(ABC):
     @abstractmethod
     def transactions(self, acct_name='Assets.Bank') -> Transactions:
         """ return Transactions """
+
+    def iter_transactions(self, acct_name='Assets.Bank', chunksize=10000):
+        """ yield Transactions in chunks of about `chunksize` rows.
+        Override to avoid reading the whole statement at once """
+        yield self.transactions(acct_name)
@@ -6,7 +6,7 @@
 import pandas as pd
 from wimm.importers import abstract_classes
 from wimm.core import Transactions
-from wimm.utils import clean_str
+from wimm.utils import clean_strs
 import wimm
 
 mapping = {'header': ['Boekingsdatum',
@@ -39,38 +39,55 @@ class Importer(abstract_classes.Importer):
 
     def __init__(self, csv_file) -> None:
         super().__init__()
+        self.csv_file = csv_file
+
+    def _read_csv(self, **kwargs):
+        """ read statement, with renamed relevant columns """
 
         header = mapping['header']
         renaming = mapping['mapping']
-
-        df = pd.read_csv(csv_file, names=header, parse_dates=['Boekingsdatum'])
-        df.rename(renaming, axis=1, inplace=True)
-
         relevant_cols = [v for k, v in renaming.items()]
 
-        self.df = df[relevant_cols]
+        def prepare(df):
+            return df.rename(renaming, axis=1)[relevant_cols]
 
-    def transactions(self, acct_name='Assets.Bank.ASN') -> Transactions:
+        reader = pd.read_csv(self.csv_file, names=header,
+                             parse_dates=['Boekingsdatum'],
+                             dtype={'Naam tegenrekening': str,
+                                    'Omschrijving': str}, **kwargs)
+
+        if 'chunksize' not in kwargs:
+            return prepare(reader)
+        return (prepare(df) for df in reader)
 
-        records = self.df.to_dict(orient='records')
+    def read(self):
+        """ read the complete statement to `self.df` """
+        if self.df is None:
+            self.df = self._read_csv()
+        return self.df
 
-        data = []
-        for r in records:
+    def transactions(self, acct_name='Assets.Bank.ASN') -> Transactions:
+        return self._convert(self.read(), acct_name)
 
-            # init data element
-            d = {}
-            d['date'] = r['date'].strftime(wimm.DATE_FMT)
-            d['description'] = r['description'].strip("'")
+    def iter_transactions(self, acct_name='Assets.Bank.ASN', chunksize=10000):
+        for df in self._read_csv(chunksize=chunksize):
+            yield self._convert(df, acct_name)
 
-            try:
-                ext_name = 'Ext.'+clean_str(r['name'])
-            except AttributeError:
-                ext_name = 'Ext.unknown'
+    @staticmethod
+    def _convert(df, acct_name):
+        """ statement rows to transactions """
 
-            d['transfers'] = {acct_name: r['amount'],
-                              ext_name: -r['amount']}
+        dates = df['date'].dt.strftime(wimm.DATE_FMT)
+        descriptions = df['description'].str.strip("'").fillna('')
+        ext_names = ('Ext.' + clean_strs(df['name'])).fillna('Ext.unknown')
+        amounts = df['amount'].astype(float)
 
-            data.append(d)
+        data = [{'date': date,
+                 'description': description,
+                 'transfers': {acct_name: amount, ext_name: -amount}}
+                for date, description, ext_name, amount in zip(
+                    dates.tolist(), descriptions.tolist(),
+                    ext_names.tolist(), amounts.tolist())]
 
         return Transactions(data)
 
@@ -79,6 +96,6 @@ if __name__ == '__main__':
 
     fName = r'/home/jev/Documents/Jev/Sojuz/Boekhouding/statements/0783206356_22042021_120234.csv'
     importer = Importer(fName)
-    print(importer.df)
+    print(importer.read())
     transactions = importer.transactions()
     print(transactions.to_yaml())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar ledger
+================
+
+Transactions flattened to one row per transfer and stored as numpy arrays:
+
+* `codes` - index into the list of (interned) account names
+* `dates` - days since epoch, `int64`
+* `cents` - transferred amount in integer cents, `int64`
+
+Balances are exact integer sums of cents (`np.add.at`) instead of a pandas
+groupby of floats, so balanced transactions add up to exactly zero.
+Amounts are converted to cents when the ledger is built and back to floats
+in the results (see `utils.to_cents`). Fractions of a cent are rounded
+with a warning.
+
+`Snapshots` keeps cumulative balances at period boundaries (month starts by
+default), so a balance at a date is one snapshot plus the entries of a
+single period.
+
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from wimm.utils import CENTS, to_cents, whole_cents
+
+NO_DATE = np.iinfo(np.int64).min  # integer value of NaT
+
+
+def sum_cents(codes, cents, n):
+    """ int64 sums of `cents` for codes `0..n-1` """
+    totals = np.zeros(n, dtype=np.int64)
+    np.add.at(totals, codes, cents)
+    return totals
+
+
+def to_days(dates):
+    """ convert a sequence of dates (strings or date objects) to epoch days """
+
+    cache = {}
+    out = np.empty(len(dates), dtype=np.int64)
+    for i, d in enumerate(dates):
+        try:
+            out[i] = cache[d]
+        except KeyError:
+            day = np.datetime64(d, 'D') if d is not None else np.datetime64('NaT')
+            out[i] = cache[d] = day.astype(np.int64)
+        except TypeError:  # unhashable
+            out[i] = np.datetime64(d, 'D').astype(np.int64)
+    return out
+
+
+class Ledger:
+    """ columnar representation of transactions """
+
+    def __init__(self, accounts=(), codes=(), dates=(), cents=()):
+        self.accounts = list(accounts)
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self.dates = np.asarray(dates, dtype=np.int64)
+        self.cents = np.asarray(cents, dtype=np.int64)
+        self._totals = None
+        self._snapshots = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    @classmethod
+    def from_transactions(cls, transactions):
+        """ build from an iterable of `Transaction` objects """
+
+        index = {}
+        codes, amounts, dates, counts = [], [], [], []
+        for tr in transactions:
+            transfers = tr['transfers']
+            for acct, amount in transfers.items():
+                try:
+                    codes.append(index[acct])
+                except KeyError:
+                    codes.append(index.setdefault(acct, len(index)))
+                amounts.append(amount)
+            dates.append(tr['date'])
+            counts.append(len(transfers))
+
+        if not whole_cents(amounts):
+            warnings.warn('amounts with fractions of a cent are rounded')
+        days = np.repeat(to_days(dates), counts)
+        return cls(index, codes, days, to_cents(amounts))
+
+    @property
+    def amounts(self):
+        """ transferred amounts as floats """
+        return self.cents / CENTS
+
+    def account_index(self):
+        """ account names as array, ordered by code """
+        return np.array(self.accounts, dtype=object)
+
+    def totals(self):
+        """ total cents per account code, calculated once """
+        if self._totals is None:
+            self._totals = sum_cents(self.codes, self.cents, len(self.accounts))
+        return self._totals
+
+    def balance(self):
+        """ account balances as a Series, sorted by account name """
+        return self.to_series(self.totals())
+
+    def balance_cents(self, date=None, freq='MS'):
+        """ account balances in cents (int64), optionally including all
+        entries up to and including `date` """
+        if date is None:
+            return self.cents_series(self.totals())
+        return self.cents_series(self.snapshots(freq).totals_before(
+            to_days([date])[0] + 1))
+
+    def cents_series(self, cents):
+        """ Series of cents per account code, sorted by account name """
+        s = pd.Series(cents, index=pd.Index(
+            self.account_index(), name='account'), name='amount')
+        return s.sort_index()
+
+    def to_series(self, cents):
+        """ Series of amounts from cents per account code, sorted by
+        account name """
+        return self.cents_series(cents) / CENTS
+
+    def snapshots(self, freq='MS'):
+        """ balance snapshots for a pandas frequency, created once """
+        if freq not in self._snapshots:
+            self._snapshots[freq] = Snapshots(self, freq)
+        return self._snapshots[freq]
+
+    def balance_at(self, date, freq='MS'):
+        """ balances including all entries up to and including `date` """
+        return self.balance_cents(date, freq) / CENTS
+
+    def period_balance(self, start=None, end=None, freq='MS'):
+        """ balance change of entries `start <= date < end`.
+        None means the first or last entry """
+        snapshots = self.snapshots(freq)
+        totals = snapshots.totals_before(None if end is None else to_days([end])[0])
+        if start is not None:
+            totals = totals - snapshots.totals_before(to_days([start])[0])
+        return self.to_series(totals)
+
+    def select(self, mask):
+        """ return a ledger with selected rows (accounts are kept) """
+        return Ledger(self.accounts, self.codes[mask],
+                      self.dates[mask], self.cents[mask])
+
+    def date_mask(self, date_range):
+        """ boolean mask for `start <= date < end`, where a bound may be
+        None. Entries without a date are not in any range """
+        start, end = date_range
+        mask = self.dates != NO_DATE
+        if start is not None:
+            mask &= self.dates >= to_days([start])[0]
+        if end is not None:
+            mask &= self.dates < to_days([end])[0]
+        return mask
+
+    def concat(self, other):
+        """ return a new ledger with rows of `other` appended.
+        Account totals are updated incrementally if already calculated """
+
+        index = {name: i for i, name in enumerate(self.accounts)}
+        remap = np.array([index.setdefault(name, len(index))
+                          for name in other.accounts], dtype=np.int64)
+
+        ledger = Ledger(index,
+                        np.concatenate((self.codes, remap[other.codes])),
+                        np.concatenate((self.dates, other.dates)),
+                        np.concatenate((self.cents, other.cents)))
+
+        if self._totals is not None:  # keep running totals
+            totals = np.zeros(len(index), dtype=np.int64)
+            totals[:len(self._totals)] = self._totals
+            np.add.at(totals, remap, other.totals())
+            ledger._totals = totals
+
+        return ledger
+
+    def to_df(self, date_range=None):
+        """ convert to DataFrame with `date`, `account` and `amount` columns """
+
+        ledger = self if date_range is None else self.select(
+            self.date_mask(date_range))
+
+        dates = ledger.dates.astype('datetime64[D]').astype('datetime64[ns]')
+        return pd.DataFrame({'date': dates,
+                             'account': ledger.account_index()[ledger.codes],
+                             'amount': ledger.amounts})
+
+
+class Snapshots:
+    """ cumulative account balances at period boundaries.
+    Entries without a date count as the earliest ones """
+
+    def __init__(self, ledger, freq='MS'):
+
+        order = np.argsort(ledger.dates, kind='stable')
+        self.dates = ledger.dates[order]
+        self.codes = ledger.codes[order]
+        self.cents = ledger.cents[order]
+        self.nr_accounts = len(ledger.accounts)
+
+        dated = self.dates[self.dates != NO_DATE]
+        if len(dated):
+            first, last = dated[[0, -1]].astype('datetime64[D]')
+            bounds = pd.date_range(first, last, freq=freq, normalize=True)
+            self.bounds = bounds.values.astype('datetime64[D]').astype(np.int64)
+        else:
+            self.bounds = np.array([], dtype=np.int64)
+
+        # rows before each boundary and balances at each boundary
+        self.rows = np.searchsorted(self.dates, self.bounds, 'left')
+        period = np.searchsorted(self.bounds, self.dates, 'right')
+        nr = len(self.bounds) + 1
+        sums = sum_cents(period * self.nr_accounts + self.codes, self.cents,
+                         nr * self.nr_accounts)
+        self.cumulative = sums.reshape(nr, self.nr_accounts).cumsum(axis=0)
+
+    def totals_before(self, day=None):
+        """ total cents per account code of entries before epoch `day`.
+        If `day` is None all entries are included """
+
+        if day is None:
+            return self.cumulative[-1].copy()
+
+        k = np.searchsorted(self.bounds, day, 'right') - 1
+        if k < 0:
+            base, start = np.zeros(self.nr_accounts, dtype=np.int64), 0
+        else:
+            base, start = self.cumulative[k], self.rows[k]
+
+        end = np.searchsorted(self.dates, day, 'left')
+        tail = sum_cents(self.codes[start:end], self.cents[start:end],
+                         self.nr_accounts)
+        return base + tail
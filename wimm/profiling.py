@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stage timings
+==============
+
+Code marks its stages (loading, parsing, building objects, aggregating)
+with `stage`:
+
+    with profiling.stage('parse') as st:
+        data = yamlio.load_file(yaml_file)
+        st.count = len(data)
+
+Nothing is recorded until `start` is called (cli options `--timings` and
+`--profile`), an inactive stage costs a function call. Stages can be nested.
+`report` prints wall time, object count and, with `memory=True`, the peak
+memory traced by `tracemalloc` for each stage.
+
+Only the standard library is imported, the cli imports this module at
+startup.
+
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+_recorder = None  # active Recorder
+
+
+class _NullStage:
+    """ stage used when not recording """
+    count = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullStage()
+
+
+class Stage:
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.level = 0
+        self.seconds = None
+        self.count = None
+        self.peak = None  # bytes
+
+    def __enter__(self):
+        self.recorder._enter(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        self.recorder._exit(self)
+        return False
+
+    def to_dict(self):
+        return {'name': self.name, 'level': self.level,
+                'seconds': self.seconds, 'count': self.count,
+                'peak_mb': None if self.peak is None else self.peak / 1e6}
+
+
+class Recorder:
+    """ collects stages in the order they started """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.stages = []
+        self._stack = []
+        self._start = time.perf_counter()
+        if memory:
+            tracemalloc.start()
+
+    def _enter(self, st):
+        st.level = len(self._stack)
+        self.stages.append(st)
+        if self.memory:
+            if self._stack:  # keep the peak of the outer stage so far
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak or 0,
+                                  tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._stack.append(st)
+
+    def _exit(self, st):
+        self._stack.pop()
+        if self.memory:
+            st.peak = max(st.peak or 0, tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak or 0, st.peak)
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._start
+        if self.memory:
+            tracemalloc.stop()
+
+    def to_dict(self):
+        return {'seconds': self.seconds,
+                'stages': [st.to_dict() for st in self.stages]}
+
+    def table(self):
+        lines = [f'{"stage":<30}{"time [s]":>10}{"count":>10}'
+                 + (f'{"peak [MB]":>11}' if self.memory else '')]
+        for st in self.stages:
+            name = '  ' * st.level + st.name
+            count = '' if st.count is None else st.count
+            line = f'{name:<30}{st.seconds:>10.3f}{count:>10}'
+            if self.memory:
+                line += f'{st.peak / 1e6:>11.1f}'
+            lines.append(line)
+        lines.append(f'{"total":<30}{self.seconds:>10.3f}')
+        return '\n'.join(lines)
+
+
+def stage(name):
+    """ context manager that records a stage if recording is active """
+    if _recorder is None:
+        return _NULL
+    return Stage(_recorder, name)
+
+
+def start(memory=False):
+    """ start recording stages, trace memory if `memory` is True """
+    global _recorder
+    _recorder = Recorder(memory)
+    return _recorder
+
+
+def report(fmt='table', stream=sys.stderr):
+    """ stop recording and print the stages as table or json """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return
+    recorder.stop()
+    if fmt == 'json':
+        print(json.dumps(recorder.to_dict()), file=stream)
+    else:
+        print(recorder.table(), file=stream)
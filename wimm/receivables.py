@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Open invoices
+==============
+
+Bank transactions are matched to invoices to find out which invoices are
+(partially) paid. A transaction pays an invoice when
+
+* its description contains the invoice id, or
+* its amount equals the open amount of an invoice,
+
+and one of its accounts is an account of the invoice or names the
+counterparty of that invoice. A description that mentions an invoice
+without such a transfer is not a payment.
+
+Invoices are looked up in dicts by id and by open amount in cents, so
+matching is a single pass over the transactions.
+
+"""
+import datetime as dt
+import re
+from collections import defaultdict
+
+import pandas as pd
+
+from wimm import DATE_FMT
+from wimm.utils import clean_str, from_cents, to_cents
+
+ID_PATTERN = re.compile(r'[A-Z]{3}[0-9]{2}_[0-9]{3}')
+DEFAULT_EXT_NAME = 'ext_company_name'
+AGING_BUCKETS = [(0, 'current'), (30, '1-30'), (60, '31-60'),
+                 (90, '61-90'), (None, '>90')]
+
+
+def cents(amount):
+    """ absolute amount in cents, a lookup key for open amounts """
+    return abs(to_cents(amount))
+
+
+def _name_key(name):
+    """ normalized last part of an account or company name """
+    return clean_str(str(name).split('.')[-1]).lower()
+
+
+def counterparty_keys(inv):
+    """ names an invoice counterparty may appear under in accounts """
+    keys = {_name_key(inv['from']), _name_key(inv['to'])}
+    if inv.get('ext_name') not in (None, DEFAULT_EXT_NAME):
+        keys.add(clean_str(inv['ext_name']).lower())
+    keys.discard(_name_key(inv['id']))
+    keys -= {'', 'uncategorized'}
+    return keys
+
+
+class Receivables:
+    """ payments of invoices, matched from transactions """
+
+    def __init__(self, invoices, transactions):
+
+        self.invoices = invoices
+        self.payments = defaultdict(list)  # invoice id -> [(date, amount)]
+        self._match(transactions)
+
+    def _match(self, transactions):
+
+        by_id = self.invoices.index.by_id
+        by_amount = defaultdict(list)
+        for inv in self.invoices:
+            by_amount[cents(inv['amount'])].append(inv)
+        keys = {inv['id']: counterparty_keys(inv) for inv in self.invoices}
+        paid = defaultdict(int)  # in cents
+
+        for tr in transactions:
+            description = tr['description'] or ''
+            transfers = tr['transfers']
+            if not transfers:
+                continue
+            amount = max(abs(v) for v in transfers.values())
+
+            tr_keys = {_name_key(acct) for acct in transfers}
+
+            def touches(inv):
+                """ transfer on an account of the invoice or its counterparty """
+                return (inv['from'] in transfers or inv['to'] in transfers
+                        or bool(keys[inv['id']] & tr_keys))
+
+            matched = None
+            for invoice_id in ID_PATTERN.findall(description):
+                if invoice_id in by_id and touches(by_id[invoice_id]):
+                    matched = by_id[invoice_id]
+                    break
+
+            if matched is not None:
+                if description == 'Invoice ' + matched['id']:
+                    continue  # booking of the invoice itself
+            else:
+                key = cents(amount)
+                for inv in by_amount.get(key, ()):
+                    rest = cents(inv['amount']) - paid[inv['id']]
+                    if rest == key and touches(inv):
+                        matched = inv
+                        break
+                if matched is None:
+                    continue
+
+            paid[matched['id']] += cents(amount)
+            self.payments[matched['id']].append((tr['date'], amount))
+            rest = cents(matched['amount']) - paid[matched['id']]
+            if rest > 0:  # the rest may be paid later
+                by_amount[rest].append(matched)
+
+    def paid(self):
+        """ paid amount per invoice id """
+        return pd.Series({k: from_cents(sum(cents(a) for _, a in v))
+                          for k, v in self.payments.items()}, dtype=float)
+
+    def open_invoices(self):
+        """ invoices with a remaining amount, as DataFrame """
+
+        rows = []
+        for inv in self.invoices:
+            paid = from_cents(sum(cents(a) for _, a in
+                                  self.payments.get(inv['id'], ())))
+            rest = from_cents(to_cents(inv.rest_amount(paid)))
+            if rest:
+                rows.append({'id': inv['id'], 'date': inv['date'],
+                             'due_date': inv['due_date'],
+                             'ext_name': inv['ext_name'],
+                             'amount': inv['amount'], 'paid': paid,
+                             'rest': rest})
+
+        columns = ['id', 'date', 'due_date', 'ext_name', 'amount', 'paid',
+                   'rest']
+        return pd.DataFrame(rows, columns=columns)
+
+    def aging(self, date=None):
+        """ open amounts grouped by days past the due date at `date` """
+
+        date = dt.datetime.strptime(date, DATE_FMT).date() if date \
+            else dt.date.today()
+        df = self.open_invoices()
+
+        due = pd.to_datetime(df['due_date'].fillna(df['date']))
+        overdue = (pd.Timestamp(date) - due).dt.days
+
+        labels = pd.Series(AGING_BUCKETS[-1][1], index=df.index)
+        for limit, label in reversed(AGING_BUCKETS[:-1]):
+            labels[overdue <= limit] = label
+
+        order = [label for _, label in AGING_BUCKETS]
+        res = df.groupby(labels)['rest'].agg(['count', 'sum'])
+        return res.reindex(order, fill_value=0)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Reports
+========
+
+Text output of the `show` commands. Reports are written to a stream, so
+the cli and the server (`wimm.server`) give the same output.
+
+Each report takes a storage backend (see `wimm.storage`) and the command
+options as keyword arguments.
+
+"""
+import wimm.core as core
+import wimm.utils as utils
+import wimm.yamlio as yamlio
+
+
+def balance(storage, stream, depth=3, nozeros=False, account=None,
+            date=None, start=None, end=None, with_invoices=False):
+    """ account balances, or changes between `start` and `end` """
+
+    if start is None and end is None:
+        accounts = storage.balance(date, with_invoices)
+    else:
+        accounts = storage.load('transactions').ledger.period_balance(start, end)
+    balance = core.account_tree(accounts).balance(depth, account, nozeros)
+
+    print('----------Balance-----------', file=stream)
+    print(balance.to_string(float_format='%.2f'), file=stream)
+    print('----------------------------', file=stream)
+    total = utils.from_cents(int(utils.to_cents(balance.values).sum()))
+    print(f'SUM: {total:.2f}', file=stream)
+
+
+def transactions(storage, stream, start=None, end=None):
+    """ transactions as yaml, optionally with `start <= date < end` """
+
+    date_range = None if start is None and end is None else (start, end)
+    trs = storage.iter_transactions(date_range)
+    yamlio.dump((utils.to_dict(tr) for tr in trs), stream)
+
+
+def invoices(storage, stream):
+    """ one line per invoice """
+
+    for inv in storage.load('invoices'):
+        print(inv, file=stream)
+
+
+def unbalanced(storage, stream):
+    """ transactions whose transfers do not add up to zero, as yaml """
+
+    trs = [tr for tr in storage.iter_transactions() if not tr.is_balanced()]
+    yamlio.dump((utils.to_dict(tr) for tr in trs), stream)
+
+
+REPORTS = {'balance': balance,
+           'transactions': transactions,
+           'invoices': invoices,
+           'unbalanced': unbalanced}
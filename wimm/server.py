@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Report server
+==============
+
+`wimm serve` loads the database once and answers report requests
+(`show balance`, `show invoices`, `show transactions`) over the Unix socket
+`.wimm/wimm.sock` in the database folder. Data files are checked for
+changes on every request (see `Storage.load`), so answers are never stale.
+
+The cli sends its requests to the server when it is running and falls back
+to loading the data itself otherwise.
+
+Protocol: the client sends one json line `{"report": name, "options": {..}}`.
+The server answers with a json status line `{"ok": true}` followed by the
+report text, or `{"ok": false, "error": message}`.
+
+This module only imports the standard library at the top, the client part
+must not slow down cli startup.
+
+"""
+import json
+import os
+import socket
+import socketserver
+import sys
+
+import wimm.structure as structure
+
+BUFFER_SIZE = 1 << 16
+
+
+def socket_path(db_path):
+    return db_path / structure.files['socket']
+
+
+class ServerError(Exception):
+    """ report failed on the server """
+
+
+def request(db_path, report, options, stream):
+    """ write a report from the server to `stream`.
+    Returns False if no server is running """
+
+    path = socket_path(db_path)
+    if not path.exists():
+        return False
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+    except (ConnectionRefusedError, FileNotFoundError):  # stale socket
+        sock.close()
+        return False
+
+    with sock, sock.makefile('rw', encoding='utf-8') as f:
+        f.write(json.dumps({'report': report, 'options': options}) + '\n')
+        f.flush()
+
+        status = json.loads(f.readline() or '{"ok": false, "error": "no answer"}')
+        if not status['ok']:
+            raise ServerError(status['error'])
+
+        while True:
+            text = f.read(BUFFER_SIZE)
+            if not text:
+                break
+            stream.write(text)
+    return True
+
+
+class _Response:
+    """ text stream that sends the status line before the first output """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.started = False
+
+    def start(self):
+        if not self.started:
+            self.wfile.write(json.dumps({'ok': True}) + '\n')
+            self.started = True
+
+    def write(self, text):
+        self.start()
+        self.wfile.write(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+
+class ReportHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        from wimm.reports import REPORTS
+
+        rfile = self.request.makefile('r', encoding='utf-8')
+        wfile = self.request.makefile('w', encoding='utf-8')
+        response = _Response(wfile)
+        try:
+            req = json.loads(rfile.readline())
+            report = REPORTS[req['report']]
+            report(self.server.storage, response, **req['options'])
+            response.start()  # for empty reports
+        except Exception as e:
+            if response.started:  # client gets incomplete output
+                print(f'error in {req}: {e!r}', file=sys.stderr)
+            else:
+                wfile.write(json.dumps({'ok': False, 'error': repr(e)}) + '\n')
+        finally:
+            try:
+                wfile.close()
+            except BrokenPipeError:  # client went away
+                pass
+
+
+class ReportServer(socketserver.UnixStreamServer):
+    """ serves reports of a storage backend, one request at a time """
+
+    def __init__(self, path, storage):
+        self.storage = storage
+        super().__init__(str(path), ReportHandler)
+
+
+def serve(db_path, storage):
+    """ load the database and answer requests until interrupted """
+
+    path = socket_path(db_path)
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+            raise RuntimeError(f'a server is already running on {path}')
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(path)  # left over from a server that stopped
+        finally:
+            probe.close()
+
+    for name in ['balance', 'transactions', 'invoices']:
+        storage.load(name)
+    storage.load('transactions').ledger.totals()
+
+    with ReportServer(path, storage) as server:
+        print(f'serving on {path}, stop with Ctrl-C', file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
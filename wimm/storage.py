@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Storage backends
+=================
+
+The database (start balance, transactions and invoices) can be kept in
+
+* yaml files in `WIMM_PATH` (`YamlStorage`, default), as named in
+  `structure.files`. Transactions of closed years can be moved to yearly
+  files `transactions/YYYY.yaml` (see `core.split_transactions`), new
+  transactions are appended to `transactions.yaml`.
+* a single SQLite file (`SqliteStorage`), with indexes on transaction date,
+  account and invoice id. Balances are summed by SQLite, in integer cents.
+
+The backend is chosen with the `storage` setting (`yaml` or `sqlite`).
+Loaded data is kept in memory until its file changes, so a long running
+process (see `wimm.server`) only loads it again after an update.
+The yaml files stay the readable source of truth, `SqliteStorage` imports
+from and exports to them.
+
+Values are stored as they are, so an export gives the same yaml as the
+import, apart from comments. Dates are stored as ISO strings.
+
+"""
+import sqlite3
+from abc import ABC, abstractmethod
+from itertools import groupby
+from operator import itemgetter
+
+import pandas as pd
+
+import wimm.core as core
+from wimm.cache import fingerprint
+from wimm.profiling import stage
+import wimm.structure as structure
+import wimm.utils as utils
+from wimm.utils import CENTS
+import wimm.yamlio as yamlio
+
+NAMES = ('balance', 'transactions', 'invoices')
+
+
+def get_storage(db_path, settings=None):
+    """ storage backend for a database folder, as set in `settings` """
+
+    settings = settings or {}
+    kind = settings.get('storage', 'yaml')
+    if kind not in STORAGES:
+        raise ValueError(f'unknown storage {kind}, options are {list(STORAGES)}')
+    return STORAGES[kind](db_path)
+
+
+class Storage(ABC):
+    """ base class of storage backends """
+
+    def __init__(self):
+        self._loaded = {}  # name -> (fingerprint, data)
+
+    @abstractmethod
+    def source(self, name):
+        """ file that holds `name`, or is appended to """
+
+    def sources(self, name):
+        """ all files that hold `name` """
+        return [self.source(name)]
+
+    def _fingerprint(self, name):
+        return [fingerprint(src, with_hash=False) for src in self.sources(name)]
+
+    @abstractmethod
+    def _load(self, name):
+        """ read `name` from the storage """
+
+    def load(self, name):
+        """ load `balance` (Series), `transactions` or `invoices`.
+        Data is loaded again only when one of its files has changed """
+        fp = self._fingerprint(name)
+        loaded = self._loaded.get(name)
+        if loaded is None or loaded[0] != fp:
+            loaded = self._loaded[name] = (fp, self._load(name))
+        return loaded[1]
+
+    @abstractmethod
+    def append(self, name, items, comment=None):
+        """ add transactions or invoices. `comment` is a note for
+        readers of the data, only kept by text based storage """
+
+    def _checked(self, name, items):
+        """ items to append. Amounts must be whole cents and transactions
+        must balance """
+        if name == 'balance':
+            raise ValueError('the start balance can not be appended to')
+        if name == 'transactions':
+            items = core.Transactions(items)
+            amounts = [v for tr in items for v in tr['transfers'].values()]
+            unbalanced = items.unbalanced()
+            if unbalanced:
+                raise ValueError(f'{len(unbalanced)} transactions do not '
+                                 f'balance, first: {unbalanced[0]}')
+        else:
+            items = core.Invoices(items)
+            amounts = [inv[k] for inv in items for k in ('amount', 'tax')
+                       if inv.get(k) is not None]
+        if not utils.whole_cents(amounts):
+            raise ValueError(f'{name} have amounts with fractions of a cent')
+        return items
+
+    @abstractmethod
+    def iter_transactions(self, date_range=None):
+        """ yield transactions, optionally with
+        `date_range[0] <= date < date_range[1]` """
+
+    def balance(self, date=None, with_invoices=False):
+        """ start balance plus transactions, optionally at the end of `date`.
+        Set `with_invoices` to add invoices that are not in transactions """
+        invoices = self.load('invoices') if with_invoices else None
+        return core.balance(self.load('transactions'), self.load('balance'),
+                            invoices, date=date)
+
+
+class YamlStorage(Storage):
+    """ yaml files in a database folder """
+
+    def __init__(self, db_path):
+        super().__init__()
+        self.db_path = db_path
+
+    def source(self, name):
+        return self.db_path / structure.files[name]
+
+    def sources(self, name):
+        if name == 'transactions':  # yearly files and transactions.yaml
+            return core.transaction_files(self.db_path)
+        return [self.source(name)]
+
+    def _load(self, name):
+        return core.load_data(name, self.db_path)
+
+    def append(self, name, items, comment=None):
+        items = self._checked(name, items)
+        self._loaded.pop(name, None)
+        with self.source(name).open('a') as f:
+            if comment is not None:
+                f.write(f'\n# {comment}\n')
+            yamlio.dump((utils.to_dict(obj) for obj in items), f)
+
+    def iter_transactions(self, date_range=None):
+        loaded = self._loaded.get('transactions')
+        if loaded is not None and loaded[0] == self._fingerprint('transactions'):
+            yield from core.Transactions.in_range(loaded[1], date_range)
+        else:  # stream instead of loading, skipping years out of range
+            for src in core.transaction_files(self.db_path, date_range):
+                yield from core.Transactions.iter_yaml(src, date_range)
+
+
+# invoice fields that are sql keywords
+INVOICE_COLUMNS = {'from': 'from_account', 'to': 'to_account'}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS balance (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    amount);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT,
+    description,
+    extra TEXT);
+CREATE TABLE IF NOT EXISTS transfers (
+    id INTEGER PRIMARY KEY,
+    transaction_id INTEGER NOT NULL REFERENCES transactions(id),
+    account TEXT NOT NULL,
+    amount);
+CREATE TABLE IF NOT EXISTS invoices (
+    pos INTEGER PRIMARY KEY,
+    {', '.join(INVOICE_COLUMNS.get(f, f) for f in core.Invoice._fields)},
+    extra TEXT);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions(date);
+CREATE INDEX IF NOT EXISTS transfers_transaction
+    ON transfers(transaction_id);
+CREATE INDEX IF NOT EXISTS transfers_account ON transfers(account, amount);
+CREATE INDEX IF NOT EXISTS invoices_id ON invoices(id);
+"""
+
+
+def _date_str(date):
+    return date if date is None or isinstance(date, str) else date.isoformat()
+
+
+def _extra(record):
+    """ keys of a record that have no column, as yaml text """
+    extra = {k: v for k, v in record.items() if k not in record._fieldset}
+    return yamlio.dump(extra) if extra else None
+
+
+class SqliteStorage(Storage):
+    """ SQLite database file """
+
+    def __init__(self, db_path, db_file=None):
+        super().__init__()
+        self.db_path = db_path
+        self.db_file = db_file or db_path / structure.files['sqlite']
+        self.con = sqlite3.connect(self.db_file)
+        self.con.executescript(SCHEMA)
+
+    def close(self):
+        self.con.close()
+
+    def source(self, name):
+        return self.db_file
+
+    def _load(self, name):
+        with stage(f'sql {name}') as st:
+            data = self._load_sql(name)
+            st.count = len(data)
+        return data
+
+    def _load_sql(self, name):
+        if name == 'balance':
+            rows = self.con.execute(
+                'SELECT account, amount FROM balance ORDER BY id')
+            return pd.Series(dict(rows))
+        if name == 'transactions':
+            return core.Transactions(self._iter_dicts())
+        if name == 'invoices':
+            return core.Invoices(self._iter_invoices())
+        raise KeyError(name)
+
+    def _iter_dicts(self, date_range=None):
+        """ yield transactions as dicts, joining their transfers """
+
+        where, params = '', []
+        if date_range is not None:
+            start, end = date_range
+            conditions = []
+            if start is not None:
+                conditions.append('t.date >= ?')
+                params.append(core._date_key(start))
+            if end is not None:
+                conditions.append('t.date < ?')
+                params.append(core._date_key(end))
+            if conditions:
+                where = 'WHERE ' + ' AND '.join(conditions)
+
+        rows = self.con.execute(
+            f'SELECT id, date, description, extra FROM transactions t {where} '
+            'ORDER BY id', params)
+        transfers = groupby(self.con.execute(
+            'SELECT f.transaction_id, f.account, f.amount FROM transfers f '
+            f'JOIN transactions t ON t.id = f.transaction_id {where} '
+            'ORDER BY f.transaction_id, f.id', params), key=itemgetter(0))
+
+        pending = next(transfers, None)
+        for tr_id, date, description, extra in rows:
+            d = {'date': date, 'description': description, 'transfers': {}}
+            if pending is not None and pending[0] == tr_id:
+                d['transfers'] = {acct: amount for _, acct, amount in pending[1]}
+                pending = next(transfers, None)
+            if extra is not None:
+                d.update(yamlio.load(extra))
+            yield d
+
+    def iter_transactions(self, date_range=None):
+        for d in self._iter_dicts(date_range):
+            yield core.Transaction(d)
+
+    def _iter_invoices(self):
+        fields = core.Invoice._fields
+        columns = ', '.join(INVOICE_COLUMNS.get(f, f) for f in fields)
+        rows = self.con.execute(
+            f'SELECT {columns}, extra FROM invoices ORDER BY pos')
+        for row in rows:
+            d = dict(zip(fields, row))
+            if row[-1] is not None:
+                d.update(yamlio.load(row[-1]))
+            yield d
+
+    def _insert(self, name, items):
+        """ insert rows, without committing """
+
+        con = self.con
+        if name == 'balance':
+            con.executemany('INSERT INTO balance (account, amount) VALUES (?, ?)',
+                            items.items())
+
+        elif name == 'transactions':
+            items = core.Transactions(items)
+            first = con.execute(
+                'SELECT COALESCE(MAX(id), 0) + 1 FROM transactions').fetchone()[0]
+            con.executemany(
+                'INSERT INTO transactions (id, date, description, extra) '
+                'VALUES (?, ?, ?, ?)',
+                ((i, _date_str(tr['date']), tr['description'], _extra(tr))
+                 for i, tr in enumerate(items, first)))
+            con.executemany(
+                'INSERT INTO transfers (transaction_id, account, amount) '
+                'VALUES (?, ?, ?)',
+                ((i, acct, amount) for i, tr in enumerate(items, first)
+                 for acct, amount in tr['transfers'].items()))
+
+        elif name == 'invoices':
+            items = core.Invoices(items)
+            fields = core.Invoice._fields
+            columns = ', '.join(INVOICE_COLUMNS.get(f, f) for f in fields)
+            marks = ', '.join('?' * (len(fields) + 1))
+            con.executemany(
+                f'INSERT INTO invoices ({columns}, extra) VALUES ({marks})',
+                ([_date_str(inv.get(f)) if f in ('date', 'due_date')
+                  else inv.get(f) for f in fields] + [_extra(inv)]
+                 for inv in items))
+        else:
+            raise KeyError(name)
+
+    def append(self, name, items, comment=None):
+        items = self._checked(name, items)
+        self._loaded.pop(name, None)
+        with self.con:
+            self._insert(name, items)
+
+    def save(self, name, data):
+        """ replace all data of `name` """
+        self._loaded.pop(name, None)
+        with self.con:
+            if name == 'transactions':
+                self.con.execute('DELETE FROM transfers')
+            self.con.execute(f'DELETE FROM {name}')
+            self._insert(name, data)
+
+    def balance(self, date=None, with_invoices=False):
+
+        if date is None:
+            transfers = 'SELECT account, amount FROM transfers'
+            params = []
+        else:  # undated transfers count as the earliest, like in `Ledger`,
+            # accounts without transfers before `date` are kept as 0
+            transfers = ('SELECT f.account, f.amount FROM transfers f'
+                         ' JOIN transactions t ON t.id = f.transaction_id'
+                         ' WHERE t.date <= ? OR t.date IS NULL UNION ALL'
+                         ' SELECT DISTINCT account, 0 FROM transfers')
+            params = [core._date_key(date)]
+
+        with stage('sql balance') as st:
+            rows = self.con.execute(  # summed as integer cents
+                f'SELECT account, SUM(CAST(ROUND(amount * {CENTS}) AS INTEGER)) FROM ('
+                f' SELECT account, amount FROM balance UNION ALL {transfers}'
+                ') GROUP BY account ORDER BY account', params)
+            cents = pd.Series(dict(rows), dtype=float, name='amount')
+            st.count = len(cents)
+
+        if with_invoices:  # added in cents, like `core.balance`
+            ledger = self.load('invoices').to_ledger()
+            cents = cents.add(ledger.balance_cents(date), fill_value=0)
+        accounts = utils.from_cents(cents)
+        accounts.index.name = 'account'
+        return accounts
+
+    def import_yaml(self, db_path=None):
+        """ replace all data with the yaml files in `db_path` """
+        db_path = db_path or self.db_path
+        for name in NAMES:
+            self.save(name, core.load_data(name, db_path))
+
+    def export_yaml(self, db_path=None):
+        """ write all data to the yaml files in `db_path` """
+        db_path = db_path or self.db_path
+        *yearly, _ = core.transaction_files(db_path)
+        years = [int(p.stem) for p in yearly if p.stem.isdigit()]
+        for p in yearly:  # replaced by the export
+            p.unlink()
+
+        for name in NAMES:
+            data = self.load(name)
+            if name == 'balance':
+                data = data.to_dict()
+            utils.save_yaml(db_path / structure.files[name], data,
+                            ask_confirmation=False)
+
+        if years:  # keep the years closed before
+            core.split_transactions(db_path, max(years) + 1)
+
+
+STORAGES = {'yaml': YamlStorage, 'sqlite': SqliteStorage}
@@ -29,11 +29,15 @@ files = {'balance': 'balance.yaml',
          'transactions': 'transactions.yaml',
          'settings': 'settings.yaml',
          'invoices': 'invoices.yaml',
-         'hashes': '.wimm/hashes'}
+         'hashes': '.wimm/hashes',
+         'sqlite': 'wimm.sqlite',
+         'socket': '.wimm/wimm.sock'}
 
 folders = {'INS': 'documents',
            'INR': 'documents',
-           'WIMM': '.wimm'}
+           'WIMM': '.wimm',
+           'transactions': 'transactions',
+           'archive': 'archive'}
 
 
 account_names = ['Assets',
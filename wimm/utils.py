@@ -5,14 +5,16 @@ utility functions
 """
 import os
 import datetime as dt
+import math
+import numbers
 import re
 from dataclasses import asdict, is_dataclass
 from pathlib import Path
 import click
-import yaml
 from yaml.loader import SafeLoader
 from wimm import DATE_FMT
 import wimm
+import wimm.yamlio as yamlio
 
 
 def clean_str(s):
@@ -20,8 +22,57 @@ def clean_str(s):
     return s.replace(" ", "_").replace(".", "").strip()
 
 
+def clean_strs(s):
+    """ vectorized `clean_str` for a Series of strings """
+    return s.str.replace(" ", "_", regex=False).str.replace(
+        ".", "", regex=False).str.strip()
+
+
+CENTS = 100  # cents per unit of an amount
+CENT_TOLERANCE = 1e-6  # float error allowed on a whole number of cents
+
+
+def to_cents(amounts):
+    """ amounts as integer cents: an int for a number, an int64 array for a
+    sequence, an int64 Series for a Series. Halves are rounded away from
+    zero, like `ROUND` in SQLite. Missing amounts (NaN or None) raise a
+    ValueError """
+    if isinstance(amounts, numbers.Real):
+        if math.isnan(amounts):
+            raise ValueError('missing amount')
+        return int(math.copysign(math.floor(abs(amounts) * CENTS + 0.5), amounts))
+
+    import numpy as np
+    import pandas as pd
+    if isinstance(amounts, pd.Series):
+        missing = amounts.index[amounts.isna()]
+        if len(missing):
+            raise ValueError(f'missing amount for {", ".join(map(str, missing))}')
+        return pd.Series(to_cents(amounts.values), index=amounts.index,
+                         name=amounts.name)
+    scaled = np.asarray(amounts, dtype=np.float64) * CENTS
+    if np.isnan(scaled).any():
+        raise ValueError('missing amount')
+    return np.copysign(np.floor(np.abs(scaled) + 0.5), scaled).astype(np.int64)
+
+
+def from_cents(cents):
+    """ integer cents (number, array or Series) as float amounts """
+    return cents / CENTS
+
+
+def whole_cents(amounts):
+    """ check that amounts (a number or sequence) have no fractions of
+    a cent """
+    import numpy as np
+    scaled = np.asarray(amounts, dtype=np.float64) * CENTS
+    return bool(np.all(np.abs(scaled - np.rint(scaled)) < CENT_TOLERANCE))
+
+
 def tax(amount, rate=0.21):
-    return round(amount-amount/(1+rate), 2)
+    """ tax included in `amount`. Calculated in cents, so that amount
+    without tax plus tax is exactly `amount` """
+    return from_cents(to_cents(amount) - to_cents(amount / (1 + rate)))
 
 
 def dialog(data_in):
@@ -93,8 +144,7 @@ def save_yaml(yaml_file, data, ask_confirmation=True):
     try:
         data.to_yaml(yaml_file)
     except AttributeError:
-        with open(yaml_file, 'w') as f:
-            yaml.dump(data, f, sort_keys=False)
+        yamlio.dump_file(yaml_file, data)
 
 
 def get_data_mappings(yaml_file='data_mappings.yaml'):
@@ -104,7 +154,7 @@ def get_data_mappings(yaml_file='data_mappings.yaml'):
     if not p.is_absolute():
         p = Path(__file__).absolute().parent / p
 
-    data = yaml.load(p.open('r'), Loader=SafeLoader)
+    data = yamlio.load_file(p)
     return data
 
 
@@ -121,30 +171,42 @@ def df_to_yaml(df):
     """ conert DataFrame to yaml string """
 
     d = df.to_dict(orient='records')
-    return yaml.dump(d)
+    return yamlio.dump(d, sort_keys=True)
 
 
-def md5(path):
-    """ calculate MD5 checksum may provide a dir or a file"""
+def file_md5(path, chunk_size=1 << 20):
+    """ md5 hash of a file, read in chunks of `chunk_size` bytes """
     import hashlib
 
-    def hash_file(p):
-        with p.open('rb') as fid:
-            hasher = hashlib.md5()
-            hasher.update(fid.read())
-            hsh = hasher.hexdigest()
+    hasher = hashlib.md5()
+    with open(path, 'rb') as fid:
+        for chunk in iter(lambda: fid.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_md5s(paths, workers=None):
+    """ md5 hashes of a list of files, calculated in a thread pool.
+    `workers=None` uses the default pool size, `workers=1` no threads """
+
+    paths = list(paths)
+    if workers == 1 or len(paths) < 2:
+        return [file_md5(p) for p in paths]
 
-        return hsh
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(file_md5, paths))
+
+
+def md5(path, workers=1):
+    """ calculate MD5 checksum may provide a dir or a file"""
 
     if path.is_dir():
-        hashes = []
-        for f in path.glob('*'):
-            if f.is_file():
-                hashes.append(hash_file(f))
-        return hashes
+        files = [f for f in path.glob('*') if f.is_file()]
+        return file_md5s(files, workers)
 
     elif path.is_file():
-        return [hash_file(path)]
+        return [file_md5(path)]
 
     else:
         raise ValueError('provide path to file or dir')
@@ -152,33 +214,42 @@ def md5(path):
 
 class Hasher:
     """ class to manage file hashes
-    hashes are stored as  hash per line
+    hashes are stored as  hash per line and kept in a set.
+    Files are hashed with `workers` threads.
 
     """
 
-    def __init__(self, data_file):
+    def __init__(self, data_file, workers=None):
 
         self.data_file = Path(data_file)
+        self.workers = workers
 
         if self.data_file.exists():
             with self.data_file.open('r') as fid:
-                lines = fid.readlines()
-
-            self.hashes = [l.strip() for l in lines]
+                self.hashes = {l.strip() for l in fid if l.strip()}
         else:
-            self.hashes = []
+            self.hashes = set()
+
+    def add(self, *paths):
+        """ add hashes of files or folders, written in one batch """
 
-    def add(self, path):
-        """ add hashes of a file or path """
+        files = []
+        for path in paths:
+            files += [f for f in path.glob('*') if f.is_file()
+                      ] if path.is_dir() else [path]
+
+        new = []
+        for hsh in self.hash_files(dict.fromkeys(files)):
+            if hsh not in self.hashes:
+                self.hashes.add(hsh)
+                new.append(hsh)
 
-        hashes = md5(path)
         with self.data_file.open('a') as f:
-            for l in hashes:
-                f.write(l+'\n')
+            f.writelines(hsh + '\n' for hsh in new)
 
     def delete_hashes(self):
         """ clear all hashes """
-        self.hashes = []
+        self.hashes = set()
         if self.data_file.exists():
             self.data_file.unlink()
 
@@ -187,6 +258,14 @@ class Hasher:
         hsh = md5(path)[0]
         return hsh in self.hashes
 
+    def hash_files(self, paths):
+        """ hashes of a list of files """
+        return file_md5s(paths, self.workers)
+
+    def are_present(self, paths):
+        """ check a list of files, returns a list of bools """
+        return [hsh in self.hashes for hsh in self.hash_files(paths)]
+
 
 def names_to_labels(names, depth=1, sep='.'):
     """
@@ -236,6 +315,49 @@ def invoice_accounts(prefix, params, key='invoice_accounts'):
     return out
 
 
+def format_column(template, params):
+    """ format a template for every row of a DataFrame `params` """
+    import string
+    import pandas as pd
+
+    out = pd.Series('', index=params.index, dtype=object)
+    for literal, field, _, _ in string.Formatter().parse(template):
+        out = out + literal
+        if field is not None:
+            out = out + params[field].astype(str)
+    return out
+
+
+def invoice_accounts_bulk(prefixes, params, key='invoice_accounts'):
+    """
+    vectorized `invoice_accounts`. Templates are looked up once per prefix.
+
+    Parameters
+    ----------
+    prefixes : pd.Series
+        invoice prefixes
+    params : pd.DataFrame
+        template fields (`invoice_id`, `ext_name`), same index as `prefixes`
+
+    Returns: DataFrame with `from` and `to` columns
+    """
+    import pandas as pd
+
+    accs = wimm.settings[key]
+    company_name = wimm.settings['company_name']
+
+    out = pd.DataFrame({'from': 'Uncategorized', 'to': 'Uncategorized'},
+                       index=prefixes.index, dtype=object)
+    for prefix, rows in prefixes.groupby(prefixes).groups.items():
+        if prefix not in accs:
+            continue
+        for k, template in accs[prefix].items():
+            template = template.replace('{company_name}', company_name)
+            out.loc[rows, k] = format_column(template, params.loc[rows])
+
+    return out
+
+
 def human_format(num):
     num = float('{:.3g}'.format(num))
     magnitude = 0
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Views for the web app
+======================
+
+`InvoiceViews` serves sorted, filtered and paginated invoices. The sort
+order of each column is calculated once, a request only filters and slices
+it. `TransactionViews` selects transactions on date and account.
+Page sizes are limited to `1..MAX_PER_PAGE`.
+A view belongs to one data object, the app creates a new one when the data
+is loaded again (see `Storage.load`).
+
+`data_version` gives an ETag and modification time of data files, so
+clients can skip unchanged responses.
+
+"""
+import datetime as dt
+import hashlib
+from dataclasses import dataclass
+from functools import lru_cache
+
+import wimm
+from wimm.cache import fingerprint
+
+SORTABLE = ('id', 'date', 'amount', 'due_date', 'ext_name', 'description')
+SEARCHED = ('id', 'description', 'ext_name', 'from', 'to')
+MAX_PER_PAGE = 1000
+
+
+def _page_size(per_page):
+    """ `per_page` limited to `1..MAX_PER_PAGE` """
+    return min(max(1, per_page), MAX_PER_PAGE)
+
+
+def _sort_key(value):
+    """ sort None values last """
+    return (1, '') if value is None else (0, value)
+
+
+@dataclass
+class Page:
+    items: list
+    page: int
+    per_page: int
+    total: int
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+
+class InvoiceViews:
+    """ sorted and filtered pages of invoices """
+
+    def __init__(self, invoices):
+        self.invoices = invoices
+        self._order = {}  # column -> positions, sorted ascending
+        self._text = None  # lower case text searched by `query`
+        self.rows = lru_cache(maxsize=64)(self._rows)
+
+    def order(self, column):
+        """ positions of invoices sorted by `column` """
+
+        if column not in SORTABLE:
+            raise KeyError(f'can not sort on {column}')
+        if column not in self._order:
+            values = [inv.get(column) for inv in self.invoices]
+            self._order[column] = sorted(range(len(values)),
+                                         key=lambda i: _sort_key(values[i]))
+        return self._order[column]
+
+    def _matches(self, search):
+        if self._text is None:
+            self._text = ['\n'.join(str(inv.get(k) or '') for k in SEARCHED).lower()
+                          for inv in self.invoices]
+        search = search.lower()
+        return [search in text for text in self._text]
+
+    def _rows(self, sort, reverse, search, prefix):
+        """ positions of selected invoices in sort order """
+
+        rows = self.order(sort)
+        if reverse:
+            rows = rows[::-1]
+        if search:
+            matches = self._matches(search)
+            rows = [i for i in rows if matches[i]]
+        if prefix:
+            ids = [inv['id'] for inv in self.invoices]
+            rows = [i for i in rows if ids[i].startswith(prefix)]
+        return rows
+
+    def query(self, sort='id', reverse=False, search=None, prefix=None,
+              page=1, per_page=50):
+        """ one page of invoices, sorted on `sort`. Select invoices with ids
+        starting with `prefix` and containing the text `search` """
+
+        rows = self.rows(sort, reverse, search or None, prefix or None)
+        page = max(1, page)
+        per_page = _page_size(per_page)
+        start = (page - 1) * per_page
+        items = [self.invoices[i] for i in rows[start:start + per_page]]
+        return Page(items, page, per_page, len(rows))
+
+
+class TransactionViews:
+    """ transactions selected on date range and account """
+
+    def __init__(self, transactions):
+        self.transactions = transactions
+        self.rows = lru_cache(maxsize=64)(self._rows)
+
+    def _rows(self, start, end, account):
+        """ transactions with `start <= date < end` and a transfer to
+        `account` or its subaccounts """
+
+        trs = self.transactions
+        date_range = None if start is None and end is None else (start, end)
+        rows = trs.in_range(trs, date_range)
+
+        if account:
+            account = account[:-2] if account.endswith('.*') else account
+            sub = account + '.'
+            rows = (tr for tr in rows if any(
+                acct == account or acct.startswith(sub)
+                for acct in tr['transfers']))
+        return list(rows)
+
+    def query(self, start=None, end=None, account=None, page=1, per_page=100):
+        """ one page of selected transactions, in file order """
+
+        rows = self.rows(start or None, end or None, account or None)
+        page = max(1, page)
+        per_page = _page_size(per_page)
+        first = (page - 1) * per_page
+        return Page(rows[first:first + per_page], page, per_page, len(rows))
+
+
+def data_version(storage, names):
+    """ ETag and last modification time (UTC) of the files holding `names` """
+
+    sources = sorted({str(src) for name in names for src in storage.sources(name)})
+    fps = [fingerprint(src, with_hash=False) for src in sources]
+    key = repr((wimm.__version__, sources, fps)).encode()
+    etag = hashlib.md5(key).hexdigest()
+    modified = max(fp['mtime'] for fp in fps) / 1e9
+    return etag, dt.datetime.fromtimestamp(modified, dt.timezone.utc)
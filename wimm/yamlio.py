@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+YAML input and output
+======================
+
+All reading and writing of yaml goes through this module. The libyaml based
+`CSafeLoader` and `CSafeDumper` are used when available, with a fallback to
+the pure python classes.
+
+Output is byte-identical to `yaml.dump` with the python dumper. The libyaml
+emitter folds long double quoted strings and writes empty keys differently,
+so a chunk whose output may contain those is dumped again with the python
+dumper.
+
+`iter_items` reads a top level sequence one item at a time, so that only
+a single item is held in memory.
+
+"""
+from itertools import islice
+from types import GeneratorType
+import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
+from yaml.events import (StreamEndEvent, SequenceStartEvent,
+                         SequenceEndEvent)
+
+try:
+    from yaml import CSafeLoader as Loader, CSafeDumper as FastDumper
+    from yaml.cyaml import CParser
+
+    class ItemLoader(CParser, Composer, SafeConstructor, Resolver):
+        """ libyaml parser with the python composer, which can compose
+        single nodes of a document """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+
+except ImportError:  # pyyaml built without libyaml
+    from yaml import SafeLoader as Loader, SafeDumper as FastDumper
+    ItemLoader = Loader
+
+Dumper = yaml.SafeDumper
+
+CHUNK_SIZE = 1000  # list items dumped at once
+
+
+def load(stream):
+    """ load yaml from a string or open file """
+    return yaml.load(stream, Loader=Loader)
+
+
+def load_file(yaml_file):
+    """ load yaml file """
+    with open(yaml_file, 'r') as f:
+        return load(f)
+
+
+def iter_items(stream):
+    """ yield items of a top level sequence one by one.
+    An empty document yields nothing """
+
+    loader = ItemLoader(stream)
+    try:
+        loader.get_event()  # stream start
+        if loader.check_event(StreamEndEvent):
+            return
+        loader.get_event()  # document start
+
+        if not loader.check_event(SequenceStartEvent):
+            data = loader.construct_document(loader.compose_node(None, None))
+            if data is None:
+                return
+            raise ValueError('yaml document is not a list')
+
+        loader.get_event()
+        while not loader.check_event(SequenceEndEvent):
+            node = loader.compose_node(None, None)
+            yield loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+def iter_file(yaml_file):
+    """ yield items of a yaml file containing a list """
+    with open(yaml_file, 'r') as f:
+        yield from iter_items(f)
+
+
+def _may_differ(text):
+    """ check for output where the libyaml emitter differs """
+    return '"' in text or '? ' in text or "'':" in text
+
+
+def _dump(data, sort_keys):
+    text = yaml.dump(data, Dumper=FastDumper, sort_keys=sort_keys)
+    if FastDumper is not Dumper and _may_differ(text):
+        text = yaml.dump(data, Dumper=Dumper, sort_keys=sort_keys)
+    return text
+
+
+def _chunks(data):
+    it = iter(data)
+    while True:
+        chunk = list(islice(it, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+
+def dump(data, stream=None, sort_keys=False):
+    """ dump data to an open file or return a string if `stream` is None.
+    Lists and generators are written in chunks, without building the
+    complete output """
+
+    if stream is None:
+        if isinstance(data, GeneratorType):
+            data = list(data)
+        return _dump(data, sort_keys)
+
+    if isinstance(data, (list, GeneratorType)):
+        empty = True
+        for chunk in _chunks(data):
+            stream.write(_dump(chunk, sort_keys))
+            empty = False
+        if empty:
+            stream.write(_dump([], sort_keys))
+    else:
+        stream.write(_dump(data, sort_keys))
+
+
+def dump_file(yaml_file, data, mode='w', sort_keys=False):
+    """ write data to a file. Use `mode='a'` to append """
+    with open(yaml_file, mode) as f:
+        dump(data, f, sort_keys=sort_keys)